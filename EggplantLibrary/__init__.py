@@ -1,12 +1,19 @@
 from datetime import datetime
 import os
+import time
 import xmlrpc.client
 import robot.api.logger as log
 from robot.api.deco import keyword
-from robot.libraries.BuiltIn import BuiltIn
 
-from .libcore import EggplantLibDynamicCore
+from . import fanout
+from .libcore import EggplantLibDynamicCore, load_pillow
+from .images import find_image_references
+from .movie import MovieSegments
+from .retry import RetryPolicy
+from .transport import create_server_proxy
+from .retention import ResultsRetentionManager, ResultsRetentionPolicy
 from .version import VERSION, EGGPLANT_VERSION_MIN
+from . import utils
 
 
 class EggplantLibrary(EggplantLibDynamicCore):
@@ -33,7 +40,95 @@ class EggplantLibrary(EggplantLibDynamicCore):
         (XML RPC Server).
         """
         uri = host + ":" + port
-        self.eggplant_server = xmlrpc.client.ServerProxy(uri)
+        self.eggdrive_uri = uri
+        self.eggplant_server = create_server_proxy(uri)
+
+    @keyword
+    def set_eggdrive_pool(self, *instances):
+        """
+        Defines eggDrive instances used by `Run Script On SUTs` to run scripts on several SUTs concurrently.
+
+        Each instance is an URI of an eggPlant instance running in the eggDrive mode with access to the same suite.
+        The instance set with the library import or `Set eggDrive Connection` is used if no pool is defined.
+
+        Examples:
+        | Set eggDrive Pool | http://127.0.0.1:5400 | http://127.0.0.1:5401 | http://127.0.0.1:5402 |
+        | Set eggDrive Pool | # reset to the single default instance |
+        """
+        self.check_no_broker("Set eggDrive Pool")
+        self.eggdrive_pool = list(instances)
+
+    @keyword
+    def run_script_on_suts(self, connections, script, *args):
+        """
+        Runs the eggPlant script on each of the SUT `connections` and returns a dictionary
+        with a result for each connection.
+
+        The connections are distributed across the eggDrive instances defined using `Set eggDrive Pool`
+        and run concurrently - one SUT at a time on each instance, as eggPlant runs a single script at a time.
+        So with enough instances the keyword takes about as long as the slowest SUT.
+        A session with the current suite is opened automatically on pool instances other than the current one.
+
+        The `script` is a keyword name of the eggPlant script, e.g. `Lists.returnList`. The `args` are passed
+        to the script the same way as usual.
+
+        Each result is a dictionary with the keys:
+        - `status` - `PASS` or `FAIL`
+        - `return_value` - the script return value
+        - `error` - the error message in case of failure
+        - `screenshot` - SUT screenshot path in case of failure (relative to the output dir), embedded in the log
+        - `duration` - execution time in seconds
+        - `eggdrive` - the eggDrive instance used
+
+        The keyword doesn't fail if the script fails on some SUTs - check the results instead.
+        If the session can't be opened on an instance, the results of its SUTs fail.
+        No screenshot is taken if connecting the SUT fails, as the screen would belong to another SUT.
+        Note that the active SUT connection of the eggDrive instances is changed after the keyword.
+        The instances are connected directly, so the keyword fails if the library uses an eggDrive broker.
+
+        Examples:
+        | @{devices}= | Create List | Device_1 | Device_2 | Device_3 |
+        | ${results}= | Run Script On SUTs | ${devices} | checkStartScreen | Welcome |
+        | Should Be Equal | ${results}[Device_2][status] | PASS |
+        """
+        self.check_no_broker("Run Script On SUTs")
+        if isinstance(connections, str):
+            connections = [connections]
+        instances = self.eggdrive_pool or [self.eggdrive_uri]
+        suite, script_name = self.split_suite_name(script)  # keyword names of several suites have a suite prefix
+        if self.multi_suite and self.eggdrive_uri in instances:
+            self.activate_suite(suite)
+        command = "RunWithNewResults \"{}\",{}".format(script_name.replace(".", "/"), self.format_arguments(*args))
+        output_dir = self.get_output_dir()
+
+        groups = fanout.distribute(connections, instances)
+        log.info(f"Run '{script}' on {len(connections)} SUTs using {len(groups)} eggDrive instances")
+        from concurrent.futures import ThreadPoolExecutor  # imported on demand, keeps the library import fast
+        results = {}
+        with ThreadPoolExecutor(max_workers=len(groups)) as executor:
+            futures = {}
+            for uri, group in groups.items():
+                start_session = uri != self.eggdrive_uri and self.pool_sessions.get(uri) != suite
+                futures[uri] = executor.submit(fanout.run_on_instance, uri, suite, command, group,
+                                               output_dir, start_session, self.pool_sessions.get(uri))
+            for uri, future in futures.items():
+                group_results, messages, session_open = future.result()
+                if uri != self.eggdrive_uri:
+                    if session_open:
+                        self.pool_sessions[uri] = suite
+                    else:  # unknown session state
+                        self.pool_sessions.pop(uri, None)
+                for message in messages:
+                    log.debug(message)
+                results.update(zip(groups[uri], group_results))
+
+        for connection in connections:
+            result = results[connection]
+            log.info(f"{connection}: {result['status']} in {result['duration']:.2f} s on {result['eggdrive']}"
+                     + (f" - {result['error']}" if result['error'] else ""))
+            if result['screenshot']:
+                self.log_embedded_image(result['screenshot'])
+        return results
 
     @keyword
     def connect_sut(self, connection_string):
@@ -47,6 +142,7 @@ class EggplantLibrary(EggplantLibDynamicCore):
         See [http://docs.testplant.com/ePF/SenseTalk/stk-sut-information-control.htm#connect-command|eggPlant docs]
         for more details.
         """
+        self.result_cache.invalidate()
         self.execute("connect {}".format(connection_string))
 
     @keyword
@@ -57,6 +153,7 @@ class EggplantLibrary(EggplantLibDynamicCore):
         The `connection_string` might be a name of a saved connection or a string of params.
         See `Connect Sut` for more examples.
         """
+        self.result_cache.invalidate()
         self.execute("disconnect {}".format(connection_string))
 
     @keyword
@@ -88,6 +185,58 @@ class EggplantLibrary(EggplantLibDynamicCore):
         screenshot_path = self.take_screenshot(rectangle, file_path, highlight_rectangle, error_if_no_sut_connection)
         self.log_embedded_image(screenshot_path)
 
+    @keyword
+    def screenshot_regions(self, rectangles, highlight=False, file_prefix=''):
+        """
+        Captures the full SUT screen once and saves crops of several regions of it into separate files.
+        All files are logged in the Robot test log, the list of crop file paths is returned.
+        So several regions need a single eggPlant round trip only. Requires Pillow.
+
+        The `rectangles` is a list of regions, each of them as four pixel coordinates *x0, y0, x1, y1*.
+        Image names or locations are not supported here - use `Screenshot` for them.
+
+        If `highlight` is set, the regions are additionally drawn on the full screenshot.
+
+        The `file_prefix` (optional) is the path prefix of the created files, relative to the current
+        Robot Framework Output Dir. If not specified, the default name is used.
+
+        Examples:
+        | @{regions}= | Create List | 0, 0, 200, 100 | 300, 300, 500, 400 |
+        | ${crops}= | Screenshot Regions | ${regions} |
+        | ${crops}= | Screenshot Regions | ${regions} | highlight=True | file_prefix=Screenshots/Header |
+        """
+        modules = load_pillow()
+        if not modules:
+            raise RuntimeError("Pillow is required for cropping screenshots. Install using: 'pip install Pillow'")
+        Image, ImageDraw = modules
+
+        if isinstance(rectangles, str):
+            rectangles = [rectangles]
+        boxes = [utils.parse_coordinates(rectangle) for rectangle in rectangles]
+        prefix = file_prefix or "Screenshots\\Regions__{0}".format(datetime.now().strftime('%Y-%m-%d__%H_%M_%S__%f'))
+        screenshot_path = self.take_screenshot(file_path=prefix + ".png")
+        output_dir = self.get_output_dir()
+
+        image = Image.open(os.path.join(output_dir, screenshot_path))
+        image.load()
+        crops = [(f"{prefix}__{index}.png", image.crop(box)) for index, box in enumerate(boxes, start=1)]
+        if utils.to_bool(highlight):
+            draw = ImageDraw.Draw(image)
+            for box in boxes:
+                draw.rectangle(box, outline='red', width=3)
+            crops.append((screenshot_path, image))
+
+        from concurrent.futures import ThreadPoolExecutor  # imported on demand, keeps the library import fast
+        with ThreadPoolExecutor() as executor:
+            list(executor.map(lambda crop: crop[1].save(os.path.join(output_dir, crop[0])), crops))
+
+        self.log_embedded_image(screenshot_path)
+        paths = [path for path, _ in crops if path != screenshot_path]
+        for box, path in zip(boxes, paths):
+            log.info(f"Region {box}:")
+            self.log_embedded_image(path)
+        return paths
+
     @keyword
     def run_command(self, command):
         """
@@ -104,6 +253,9 @@ class EggplantLibrary(EggplantLibDynamicCore):
         | Run Command | click \\"someImage\\" |
         """
 
+        self.result_cache.invalidate()  # the command might change the SUT state
+        if self.image_check != 'off':
+            self.check_image_references(self.active_suite or self.eggplant_suite, find_image_references(command))
         result = self.execute(command)
         return result
 
@@ -123,6 +275,7 @@ class EggplantLibrary(EggplantLibDynamicCore):
         s = suite
         if not suite:
             s = self.eggplant_suite
+        self.result_cache.invalidate()
         log.debug("Open the eggPlant session with the test suite: {}".format(s))
         try:
             out = self.eggplant_server.startsession(s)
@@ -140,6 +293,7 @@ class EggplantLibrary(EggplantLibDynamicCore):
         except ConnectionRefusedError as e:
             log.info(f"ConnectionRefusedError - {e}")
             raise Exception("Failed connecting to eggPlant - check it's running in eggDrive mode")
+        self.active_suite = s
 
         # check eggplant version compatibility first - but only once
         if not self.eggplant_version_checked:
@@ -149,6 +303,50 @@ class EggplantLibrary(EggplantLibDynamicCore):
                          'See README for more information."')
             self.eggplant_version_checked = True
 
+    @keyword
+    def warm_up(self, *connections):
+        """
+        Prepares the eggPlant session and the suite before the tests start, running the steps concurrently:
+        - opens the session with the default suite (see `Open Session`) including the eggPlant version check
+        and connects the SUT `connections` one after another (see `Connect SUT`)
+        - checks that all scripts and images of the suite are readable
+        - reads the arguments, documentation and tags of all eggPlant scripts into the keyword metadata cache
+
+        So the first test doesn't pay for these steps. The duration of each step is logged and returned
+        as a dictionary of seconds, the `total` key contains the duration of the whole warm-up.
+        Fails if some scripts or images are not readable.
+
+        Examples:
+        | Warm Up | # open the session only |
+        | ${durations}= | Warm Up | Windows_10_1 | {serverID: "localhost", portNum: "5900"} |
+        | Suite Setup | Warm Up | Windows_10_1 |
+        """
+        def timed(function, *args):
+            started = time.perf_counter()
+            result = function(*args)
+            return result, time.perf_counter() - started
+
+        from concurrent.futures import ThreadPoolExecutor  # imported on demand, keeps the library import fast
+        warm_up_started = time.perf_counter()
+        durations = {}
+        # file system steps run in background, eggDrive steps in the main thread - so their messages are logged
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            assets = executor.submit(timed, self.check_suite_assets)
+            index = executor.submit(timed, self.build_keyword_index)
+            _, durations['session'] = timed(self.open_session)
+            for connection in connections:
+                _, durations[f'connect {connection}'] = timed(self.connect_sut, connection)
+            (checked, unreadable), durations['assets'] = assets.result()
+            script_count, durations['keyword index'] = index.result()
+        durations['total'] = time.perf_counter() - warm_up_started
+
+        log.info(f"Checked {checked} scripts and images, read metadata of {script_count} eggPlant scripts")
+        log.info("Warm-up step durations:\n" + "\n".join(f"{seconds:8.3f} s | {step}"
+                                                          for step, seconds in durations.items()))
+        if unreadable:
+            raise Exception(f"{len(unreadable)} suite files not readable: {', '.join(unreadable[:10])}")
+        return durations
+
     @keyword
     def close_session(self, suite=''):
         """
@@ -161,7 +359,8 @@ class EggplantLibrary(EggplantLibDynamicCore):
         """
         s = suite
         if not suite:
-            s = self.eggplant_suite
+            s = self.active_suite or self.eggplant_suite
+        self.active_suite = None
         log.debug("Close the eggPlant session with the test suite: {}".format(s))
         try:
             out = self.eggplant_server.endsession(s)
@@ -175,6 +374,155 @@ class EggplantLibrary(EggplantLibDynamicCore):
         except ConnectionRefusedError as e:
             log.info(f"ConnectionRefusedError - {e}")
             raise Exception("Failed connecting to eggPlant - check it's running in eggDrive mode")
+        finally:
+            for uri, pool_suite in self.pool_sessions.items():
+                try:
+                    create_server_proxy(uri).endsession(pool_suite)
+                except (xmlrpc.client.Fault, OSError) as e:
+                    log.info(f"Closing the session on the eggDrive instance {uri} failed: {e}")
+            self.pool_sessions.clear()
+
+    @keyword
+    def set_results_retention_policy(self, max_age_days='', max_count_per_script='', max_total_size_mb='',
+                                     background_interval=0, dry_run=False, results_dir=''):
+        """
+        Sets a retention policy for the eggPlant `Results` folder of the suite.
+
+        Each eggPlant script is executed using `RunWithNewResults`, which creates a new results folder
+        with a log file for each call. The policy removes old run folders:
+        - `max_age_days` - run folders older than this are removed
+        - `max_count_per_script` - only the newest N run folders of each script are kept
+        - `max_total_size_mb` - the oldest run folders are removed until the total size fits the limit
+        Each limit is optional. The newest run folder of each script is never removed.
+
+        The policy is applied at the end of the suite. If `background_interval` (seconds) is set,
+        it's also applied periodically in a background thread during the run.
+        The background thread throttles removals not to slow down eggPlant.
+
+        In the `dry_run` mode no folders are removed - only the report is logged.
+
+        The `results_dir` (optional) is the path to the eggPlant results folder.
+        If not specified, the `Results` folder in the current suite is used.
+
+        Examples:
+        | Set Results Retention Policy | max_age_days=7 | max_count_per_script=20 |
+        | Set Results Retention Policy | max_total_size_mb=2000 | background_interval=600 |
+        | Set Results Retention Policy | max_age_days=1 | dry_run=True |
+        """
+        if self.results_retention:
+            self.results_retention.stop_background()
+            self.log_retention_reports()
+
+        policy = ResultsRetentionPolicy(max_age_days, max_count_per_script, max_total_size_mb,
+                                        utils.to_bool(dry_run))
+        if policy.is_empty():
+            log.info("No retention limits set - the results retention is disabled")
+            self.results_retention = None
+            return
+
+        results_dir = results_dir or os.path.join(self.eggplant_suite, "Results")
+        log.info(f"Results retention policy for '{results_dir}': {policy}")
+        self.results_retention = ResultsRetentionManager(results_dir, policy)
+        if float(background_interval) > 0:
+            self.results_retention.start_background(background_interval)
+
+    @keyword
+    def clean_up_results(self, dry_run=None):
+        """
+        Applies the results retention policy right now and returns the list of removed run folders.
+        The policy has to be set before using `Set Results Retention Policy`.
+
+        If `dry_run` is set, it overrides the dry run setting of the policy -
+        the folders which would be removed are returned and logged, but not removed.
+
+        Examples:
+        | ${removed}= | Clean Up Results |
+        | ${would be removed}= | Clean Up Results | dry_run=True |
+        """
+        if not self.results_retention:
+            raise RuntimeError("No results retention policy set - use 'Set Results Retention Policy' first")
+        if dry_run is not None:
+            dry_run = utils.to_bool(dry_run)
+        self.log_retention_reports()  # the background thread reports first
+        report = self.results_retention.apply(dry_run)
+        log.info(report.to_text())
+        self.results_retention.pop_reports()
+        return report.removed_paths
+
+    @keyword
+    def clear_result_cache(self):
+        """
+        Removes all cached return values of eggPlant scripts.
+
+        Scripts with the `cache` tag in the last line of their documentation (e.g. `Tags: cache` or `Tags: cache:60`)
+        are considered as pure queries - their return values are cached for the TTL in seconds (default 300).
+        The cache is cleared automatically when a script without the tag is called, or by `Connect SUT`,
+        `Disconnect SUT`, `Run Command` and `Open Session`. Use this keyword if the SUT state changed otherwise.
+        """
+        log.info(self.result_cache.stats())
+        self.result_cache.invalidate()
+
+    @keyword
+    def set_adaptive_timeouts(self, factor=3, floor=30, ceiling=1800):
+        """
+        Changes how adaptive timeouts of eggPlant scripts are computed.
+        The adaptive timeouts have to be enabled using the `adaptive_timeouts` import parameter.
+
+        The timeout of a script is its p99 duration from the previous runs multiplied by the `factor`,
+        but not less than the `floor` and not more than the `ceiling` (seconds).
+        Scripts with not enough history get the `ceiling`.
+
+        When a script exceeds its timeout, the call fails and a screenshot is taken.
+        Note that eggPlant might still be running the script - the next commands might wait until it's finished.
+
+        Example:
+        | Set Adaptive Timeouts | factor=5 | floor=60 | ceiling=3600 |
+        """
+        if not self.duration_store:
+            raise RuntimeError("Adaptive timeouts are disabled - set the 'adaptive_timeouts' import parameter")
+        self.duration_store.factor = float(factor)
+        self.duration_store.floor = float(floor)
+        self.duration_store.ceiling = float(ceiling)
+
+    @keyword
+    def set_retry_policy(self, max_attempts=3, base_delay=1, max_delay=30, transient_patterns=None,
+                         fatal_patterns=None, keyword='', test_budget=None):
+        """
+        Enables retrying eggPlant scripts which fail because of a transient eggDrive fault, e.g. eggDrive being busy
+        under load. Failures reported by the script itself are never retried.
+
+        - `max_attempts` - number of attempts including the first one, `1` disables retries.
+        - `base_delay` and `max_delay` - the delay before a retry is random between zero and `base_delay` doubled
+        with each attempt, but not more than `max_delay` (seconds).
+        - `transient_patterns` and `fatal_patterns` - regular expressions (a list or a single one) matched against
+        the XML RPC fault string. Fatal patterns win, faults matching no transient pattern are not retried.
+        Defaults: `BUSY`, timeouts, lost connections as transient - no active session, syntax errors and
+        unknown commands as fatal. Connection errors are always transient.
+        - `keyword` - the policy applies to this eggPlant keyword only, e.g. `Lists.returnList`.
+        Otherwise it's the default policy for all eggPlant keywords.
+        - `test_budget` - max. number of retries per test, shared by all keywords. Default is `10`.
+
+        Each retry is logged as a warning. A summary of the retries in the suite is logged at the suite end,
+        a summary of all retries in the run is saved into `eggplant_retries.txt` in the output dir.
+
+        Examples:
+        | Set Retry Policy | max_attempts=3 | base_delay=2 | test_budget=5 |
+        | Set Retry Policy | max_attempts=5 | keyword=checkStartScreen |
+        | Set Retry Policy | transient_patterns=BUSY | fatal_patterns=(?i)license |
+        | Set Retry Policy | max_attempts=1 | # disable retries |
+        """
+        if isinstance(transient_patterns, str):
+            transient_patterns = [transient_patterns]
+        if isinstance(fatal_patterns, str):
+            fatal_patterns = [fatal_patterns]
+        policy = RetryPolicy(max_attempts, base_delay, max_delay, transient_patterns, fatal_patterns)
+        if keyword:
+            self.keyword_retry_policies[keyword.lower().replace(" ", "").replace("_", "")] = policy
+        else:
+            self.retry_policy = policy
+        if test_budget is not None:
+            self.retry_test_budget = int(test_budget)
+            self.retry_budget_left = self.retry_test_budget
 
     @keyword
     def start_movie(self, file_path='', fps=15, compression_rate=1, highlighting=True, extra_time=5):
@@ -204,44 +552,96 @@ class EggplantLibrary(EggplantLibDynamicCore):
             raise RuntimeError("Given file_path='%s' must be relative to Robot output dir" % path)
 
         # image output file path is relative to robot framework output
-        full_path = os.path.join(BuiltIn().get_variable_value("${OUTPUT DIR}"), path)
+        full_path = os.path.join(self.get_output_dir(), path)
         if not os.path.exists(os.path.split(full_path)[0]):
             os.makedirs(os.path.split(full_path)[0])
 
-        self.execute(f'StartMovie "{full_path}", framesPerSecond:{fps}, compressionRate:{compression_rate}, '
-                     f'imageHighlighting:{highlighting}, extraTime:{extra_time}')
+        with self.eggplant_server.lock:  # the recording is shared by all threads using the session
+            if self.movie_segments:  # previous segmented recording - keep the pinned segments only
+                self.movie_segments.discard_finished()
+                self.movie_segments = None
+
+            self.execute(self.movie_command(full_path, fps, compression_rate, highlighting, extra_time))
+
+            # and embed it into the RF log
+            log.info('Start video recording')
+            self.log_embedded_video(path)
+            self.current_movie_path = path  # save it to embed video in the log in case of errors
+        return path
+
+    @keyword
+    def start_segmented_movie(self, segment_duration=60, keep_segments=3, folder='', fps=15, compression_rate=1,
+                              highlighting=True):
+        """
+        Starts video recording in short segments, which are rotated like a ring buffer.
+        Returns the path to the segments folder, relative to the current Robot Framework output dir.
+
+        Only the last `keep_segments` segments are kept on disk - older ones are deleted.
+        When an eggPlant script fails, the kept segments are embedded into the log and never deleted.
+        Segments of passed tests are deleted at the test end.
+        So the disk usage stays bounded regardless of the run length.
+
+        The `segment_duration` (seconds) is checked before each eggPlant script call,
+        so a segment might be longer if a single script runs longer.
+
+        The `folder` (optional) is relative to the current Robot Framework output dir.
+        If not specified, the default name is used.
+
+        See `Start Movie` for the `fps`, `compression_rate` and `highlighting` parameters.
+        Use `Stop Movie` to stop the recording.
 
-        # and embed it into the RF log
-        log.info('Start video recording')
-        self.log_embedded_video(path)
-        self.current_movie_path = path  # save it to embed video in the log in case of errors
+        Examples:
+        | Start Segmented Movie |
+        | Start Segmented Movie | segment_duration=30 | keep_segments=4 | compression_rate=0.5 |
+        """
+        path = folder
+        if not folder:
+            path = "Movies\\Segments__{0}".format(datetime.now().strftime('%Y-%m-%d__%H_%M_%S'))
+
+        if os.path.isabs(path):
+            raise RuntimeError("Given folder='%s' must be relative to Robot output dir" % path)
+
+        with self.eggplant_server.lock:  # the recording is shared by all threads using the session
+            if self.movie_segments:
+                self.movie_segments.discard_finished()
+            self.movie_segments = MovieSegments(self.get_output_dir(), path, segment_duration, keep_segments)
+            # no extra time - the next segment starts right after the previous one is stopped
+            self.movie_segment_options = (fps, compression_rate, highlighting, 0)
+
+            log.info(f'Start segmented video recording: {segment_duration} s segments, keep last {keep_segments}')
+            self.start_movie_segment()
         return path
 
     @keyword
     def stop_movie(self, error_if_no_movie_started=False):
         """
-        Stops current video recording.
+        Stops current video recording - a usual or a segmented one.
 
         Normally there is no error thrown in case of no active recording,
         but it can be enabled setting the `error_if_no_movie_started` parameter.
         """
         log.info("Stop video recording.")
-        try:
-            self.execute('StopMovie')
-            if self.current_movie_path:
-                self.log_embedded_video(self.current_movie_path)
-            else:
-                log.info("Saving video into log failed - current recording file path empty!")
-        except xmlrpc.client.Fault as e:
-            no_movie_error = 'StopMovie is not allowed -- there is no movie being recorded'
-            if no_movie_error in e.faultString:
-                log.debug("XMLRPC execution failure! Fault code:{}. Fault string: {}".
-                          format(e.faultCode, e.faultString))
-                if error_if_no_movie_started:
-                    raise Exception(e.faultString)
+        with self.eggplant_server.lock:  # the recording is shared by all threads using the session
+            try:
+                self.execute('StopMovie')
+                if self.movie_segments and self.movie_segments.recording:
+                    self.movie_segments.finish_current()
+                    log.info(f"Segmented recording stopped, segments on disk: {len(self.movie_segments.segments)}, "
+                             f"{self.movie_segments.disk_usage() / 1024 / 1024:.1f} MB")
+                elif self.current_movie_path:
+                    self.log_embedded_video(self.current_movie_path)
                 else:
-                    log.info(e.faultString)
-            else:
-                raise e
-        finally:
-            self.current_movie_path = None  # reset it in any case
+                    log.info("Saving video into log failed - current recording file path empty!")
+            except xmlrpc.client.Fault as e:
+                no_movie_error = 'StopMovie is not allowed -- there is no movie being recorded'
+                if no_movie_error in e.faultString:
+                    log.debug("XMLRPC execution failure! Fault code:{}. Fault string: {}".
+                              format(e.faultCode, e.faultString))
+                    if error_if_no_movie_started:
+                        raise Exception(e.faultString)
+                    else:
+                        log.info(e.faultString)
+                else:
+                    raise e
+            finally:
+                self.current_movie_path = None  # reset it in any case
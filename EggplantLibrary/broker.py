@@ -0,0 +1,304 @@
+"""
+Local broker daemon sharing eggDrive instances between several Robot processes (e.g. pabot workers).
+
+eggDrive runs a single session at a time. The broker owns the eggDrive connections and leases each instance
+to one Robot process at a time - from 'StartSession' until 'EndSession', or until the lease is idle for longer
+than the idle timeout while other processes are waiting. Waiting processes are served by priority
+and first come, first served within the same priority. The eggDrive sessions are kept open between leases,
+so the next process using the same suite doesn't wait for the session start.
+
+The library connects to the broker over its Unix socket if the 'broker' import parameter is set.
+The queue depth, wait times and leases are reported by '--stats'.
+
+Usage:
+    python -m EggplantLibrary.broker --socket /tmp/eggplant-broker.sock --eggdrive http://127.0.0.1:5400
+    python -m EggplantLibrary.broker --socket /tmp/eggplant-broker.sock --stats
+"""
+import argparse
+import heapq
+import itertools
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+import urllib.parse
+import xmlrpc.client
+from xmlrpc.server import SimpleXMLRPCDispatcher, SimpleXMLRPCRequestHandler
+
+from .transport import client_uri, create_server_proxy, create_transport
+
+if not hasattr(socket, 'AF_UNIX'):
+    raise ImportError("The eggDrive broker needs Unix sockets, which are not available on this platform")
+
+
+def parse_client_path(path):
+    """
+    :return: client id and priority from the request path, see 'client_uri'
+    """
+    parts = path.strip("/").split("/")
+    client_id = urllib.parse.unquote(parts[0]) if parts[0] else "anonymous"
+    try:
+        priority = int(parts[1]) if len(parts) > 1 else 0
+    except ValueError:
+        priority = 0
+    return client_id, priority
+
+
+class Instance:
+    """
+    An eggDrive instance owned by the broker. Used only by the client holding the lease.
+    """
+
+    def __init__(self, uri):
+        self.uri = uri
+        self.server = xmlrpc.client.ServerProxy(uri, transport=create_transport(uri))
+        self.suite = None  # suite of the open session - kept open between leases
+        self.holder = None  # client id
+        self.busy = False  # a command is running
+        self.last_used = time.monotonic()
+        self.commands = 0
+        self.busy_seconds = 0.0
+
+
+class Broker:
+    """
+    Leases eggDrive instances to clients and forwards their eggDrive commands.
+    """
+
+    poll_interval = 1.0  # seconds, waiting clients check for idle leases this often
+
+    def __init__(self, uris, idle_timeout=300.0):
+        self.instances = [Instance(uri) for uri in uris]
+        self.idle_timeout = float(idle_timeout)
+        self.condition = threading.Condition()
+        self.waiting = []  # heap of [-priority, ticket, client id, start time]
+        self.tickets = itertools.count()
+        self.leases = {}  # client id -> instance
+        self.suites = {}  # client id -> suite of its session, restored if the lease has been taken away
+        self.wait_times = {}  # priority -> [count, total seconds, max seconds]
+        self.reclaimed = 0
+
+    def dispatch(self, client_id, priority, method, params):
+        if method == 'broker_stats':
+            return self.stats()
+        if method.lower() == 'startsession':
+            self.suites[client_id] = params[0] if params else None
+            instance = self.acquire(client_id, priority)
+            self.run(instance, client_id, lambda: '')  # opens the session if needed
+            return ''
+        if method.lower() == 'endsession':
+            self.suites.pop(client_id, None)
+            self.release(client_id)
+            return ''
+        instance = self.acquire(client_id, priority)
+        return self.run(instance, client_id, lambda: getattr(instance.server, method)(*params))
+
+    def acquire(self, client_id, priority):
+        """
+        Returns the instance leased to the client - waits in the queue for a free one if there is no lease yet
+        """
+        with self.condition:
+            instance = self.leases.get(client_id)
+            if instance:
+                return instance
+            entry = [-priority, next(self.tickets), client_id, time.monotonic()]
+            heapq.heappush(self.waiting, entry)
+            try:
+                while True:
+                    if self.waiting[0] is entry:
+                        instance = self.find_free(self.suites.get(client_id)) or self.reclaim_idle()
+                        if instance:
+                            break
+                    self.condition.wait(self.poll_interval)
+            finally:
+                self.waiting.remove(entry)
+                heapq.heapify(self.waiting)
+            instance.holder = client_id
+            instance.last_used = time.monotonic()
+            self.leases[client_id] = instance
+            waited = time.monotonic() - entry[3]
+            wait_time = self.wait_times.setdefault(priority, [0, 0.0, 0.0])
+            wait_time[0] += 1
+            wait_time[1] += waited
+            wait_time[2] = max(wait_time[2], waited)
+            self.condition.notify_all()  # the next client may get another free instance
+            return instance
+
+    def find_free(self, suite):
+        free = [instance for instance in self.instances if instance.holder is None]
+        for instance in free:
+            if instance.suite == suite:  # the session is warm already
+                return instance
+        return free[0] if free else None
+
+    def reclaim_idle(self):
+        """
+        Takes the lease away from a client which hasn't sent any command for longer than the idle timeout -
+        e.g. a crashed Robot process. The client gets a new lease with its suite on the next command.
+        """
+        now = time.monotonic()
+        for instance in self.instances:
+            if instance.holder is not None and not instance.busy and now - instance.last_used > self.idle_timeout:
+                self.leases.pop(instance.holder, None)
+                instance.holder = None
+                self.reclaimed += 1
+                return instance
+        return None
+
+    def release(self, client_id):
+        with self.condition:
+            instance = self.leases.pop(client_id, None)
+            if instance:
+                instance.holder = None
+                self.condition.notify_all()
+
+    def run(self, instance, client_id, command):
+        """
+        Runs the command on the leased instance - the session with the suite of the client is opened first if needed
+        """
+        with self.condition:
+            if instance.holder != client_id:  # reclaimed in the meantime
+                raise xmlrpc.client.Fault(1, "The eggDrive lease expired, the client was idle for too long")
+            instance.busy = True
+        started = time.monotonic()
+        try:
+            suite = self.suites.get(client_id)
+            if suite and instance.suite != suite:
+                self.switch_session(instance, suite)
+            return command()
+        finally:
+            with self.condition:
+                instance.busy = False
+                instance.last_used = time.monotonic()
+                instance.commands += 1
+                instance.busy_seconds += instance.last_used - started
+
+    @staticmethod
+    def switch_session(instance, suite):
+        if instance.suite:
+            try:
+                instance.server.endsession(instance.suite)
+            except xmlrpc.client.Fault:
+                pass
+        instance.suite = None
+        try:
+            instance.server.startsession(suite)
+        except xmlrpc.client.Fault as e:
+            if "BUSY: Session in progress" not in e.faultString:
+                raise
+            instance.server.endsession(suite)  # a session opened before the broker started
+            instance.server.startsession(suite)
+        instance.suite = suite
+
+    def stats(self):
+        now = time.monotonic()
+        with self.condition:
+            return {
+                'queue_depth': len(self.waiting),
+                'waiting': [{'client': entry[2], 'priority': -entry[0], 'waiting_seconds': now - entry[3]}
+                            for entry in sorted(self.waiting)],
+                'instances': [{'uri': instance.uri, 'suite': instance.suite or '', 'holder': instance.holder or '',
+                               'idle_seconds': 0.0 if instance.busy else now - instance.last_used,
+                               'commands': instance.commands, 'busy_seconds': instance.busy_seconds}
+                              for instance in self.instances],
+                'wait_times': {str(priority): {'leases': count, 'total_seconds': total, 'max_seconds': longest,
+                                               'avg_seconds': total / count}
+                               for priority, (count, total, longest) in sorted(self.wait_times.items())},
+                'reclaimed_leases': self.reclaimed,
+            }
+
+    def close(self):
+        """
+        Ends the sessions kept open
+        """
+        for instance in self.instances:
+            if instance.suite:
+                try:
+                    instance.server.endsession(instance.suite)
+                except (xmlrpc.client.Fault, OSError):
+                    pass
+                instance.suite = None
+
+
+class BrokerRequestHandler(SimpleXMLRPCRequestHandler):
+    protocol_version = "HTTP/1.1"  # keeps the connections of the clients open
+    rpc_paths = ()  # any path - it identifies the client, see 'client_uri'
+    disable_nagle_algorithm = False  # a TCP option, not available for Unix sockets
+
+    def _dispatch(self, method, params):
+        client_id, priority = parse_client_path(self.path)
+        return self.server.broker.dispatch(client_id, priority, method, params)
+
+    def address_string(self):
+        return self.server.server_address  # Unix socket clients have no address
+
+
+class BrokerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer, SimpleXMLRPCDispatcher):
+    """
+    XML RPC server on a Unix socket, each client connection is handled in an own thread
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, broker):
+        self.broker = broker
+        self.logRequests = False
+        SimpleXMLRPCDispatcher.__init__(self)
+        socketserver.UnixStreamServer.__init__(self, socket_path, BrokerRequestHandler)
+
+
+def remove_stale_socket(socket_path):
+    """
+    Removes the socket file left by a broker which hasn't been shut down properly
+    """
+    if not os.path.exists(socket_path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+    except OSError:
+        os.unlink(socket_path)
+    else:
+        raise SystemExit(f"Another broker is running on {socket_path}")
+    finally:
+        probe.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--socket", required=True, help="path of the Unix socket")
+    parser.add_argument("--eggdrive", action="append", default=[], help="eggDrive URI, may be used several times")
+    parser.add_argument("--idle-timeout", type=float, default=300.0,
+                        help="seconds after which an idle lease is taken away if other clients are waiting")
+    parser.add_argument("--stats", action="store_true", help="print statistics of the running broker")
+    args = parser.parse_args(argv)
+
+    if args.stats:
+        broker = create_server_proxy(client_uri("stats"), socket_path=args.socket)
+        print(json.dumps(broker.broker_stats(), indent=1))
+        return 0
+    if not args.eggdrive:
+        parser.error("at least one --eggdrive URI is required")
+
+    remove_stale_socket(args.socket)
+    broker = Broker(args.eggdrive, args.idle_timeout)
+    server = BrokerServer(args.socket, broker)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))  # the sessions are ended and the socket removed below
+    print(f"eggDrive broker listening on {args.socket}, eggDrive instances: {', '.join(args.eggdrive)}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        broker.close()
+        os.unlink(args.socket)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
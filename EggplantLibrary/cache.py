@@ -0,0 +1,57 @@
+from collections import OrderedDict
+import copy
+import threading
+import time
+
+
+class ResultCache:
+    """
+    Cache for return values of idempotent eggPlant scripts (pure queries), with TTL and LRU eviction.
+
+    Entries are keyed by the script name and the encoded arguments.
+    The returned values are copies - so changing a returned list in RF doesn't change the cached value.
+    The cache may be used from several threads.
+    """
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.entries = OrderedDict()  # key -> (expiration time, value)
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns a tuple (found, value). Expired entries are removed.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > time.monotonic():
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return True, copy.deepcopy(value)
+                del self.entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, copy.deepcopy(value))
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self):
+        with self.lock:
+            if self.entries:
+                self.invalidations += 1
+                self.entries.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        hit_rate = self.hits / total * 100 if total else 0
+        return (f"Result cache: {self.hits} hits, {self.misses} misses ({hit_rate:.0f}% hit rate), "
+                f"{self.invalidations} invalidations, {len(self.entries)} entries")
@@ -0,0 +1,98 @@
+import time
+
+from robot.libraries.BuiltIn import BuiltIn
+from robot.utils import timestr_to_secs
+
+# BuiltIn keywords which expect the keyword they run to fail, in the normalized form
+expected_failure_keywords = ('runkeywordandreturnstatus', 'runkeywordandignoreerror', 'runkeywordandexpecterror',
+                             'waituntilkeywordsucceeds')
+retrying_keyword = 'waituntilkeywordsucceeds'
+
+
+class ExpectedFailureContext:
+    __slots__ = ('name', 'depth', 'attempts', 'max_attempts', 'deadline', 'interval')
+
+    def __init__(self, name, depth):
+        self.name = name
+        self.depth = depth
+        self.attempts = 0
+        self.max_attempts = None
+        self.deadline = None
+        self.interval = 0.0
+
+    def last_attempt(self):
+        """
+        Checks if the current attempt of 'Wait Until Keyword Succeeds' is the last one.
+        With a timeout instead of a count it's the last one if no further attempt fits into the timeout.
+        """
+        if self.max_attempts is not None:
+            return self.attempts >= self.max_attempts
+        if self.deadline is not None:
+            return time.monotonic() + self.interval >= self.deadline
+        return False
+
+
+class ExpectedFailureContexts:
+    """
+    Tracks RF constructs which expect failures of the keywords inside - e.g. 'Run Keyword And Return Status',
+    'Wait Until Keyword Succeeds' or the TRY branch of TRY/EXCEPT - using the listener keyword events.
+    Expensive failure diagnostics may be skipped inside of them, see 'diagnostics_allowed'.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.contexts = []
+
+    def start_keyword(self, attrs):
+        self.depth += 1
+        innermost = self.contexts[-1] if self.contexts else None
+        if innermost and innermost.name == retrying_keyword and innermost.depth == self.depth - 1:
+            innermost.attempts += 1  # each run of the keyword inside is an attempt
+
+        if attrs['type'] == 'TRY':
+            self.contexts.append(ExpectedFailureContext('try', self.depth))
+            return
+        if attrs['libname'] != 'BuiltIn':
+            return
+        name = attrs['kwname'].lower().replace(" ", "").replace("_", "")
+        if name in expected_failure_keywords:
+            context = ExpectedFailureContext(name, self.depth)
+            if name == retrying_keyword and len(attrs['args']) >= 2:
+                self.parse_retry(context, attrs['args'][0], attrs['args'][1])
+            self.contexts.append(context)
+
+    def end_keyword(self, attrs):
+        if self.contexts and self.contexts[-1].depth == self.depth:
+            self.contexts.pop()
+        self.depth -= 1
+
+    @staticmethod
+    def parse_retry(context, retry, retry_interval):
+        """
+        Reads the retry count or timeout and the retry interval of 'Wait Until Keyword Succeeds'
+        """
+        try:
+            retry, retry_interval = BuiltIn().replace_variables([retry, retry_interval])
+            retry = str(retry).strip().lower()
+            for suffix in ('times', 'time', 'x'):
+                if retry.endswith(suffix):
+                    context.max_attempts = int(retry[:-len(suffix)].strip())
+                    break
+            else:
+                context.deadline = time.monotonic() + timestr_to_secs(retry)
+            context.interval = timestr_to_secs(str(retry_interval).lower().replace("strict:", "").strip())
+        except Exception:  # unknown format - RF reports it itself
+            pass
+
+    def diagnostics_allowed(self, policy):
+        """
+        Decides if failure diagnostics should be done according to the policy:
+        - 'always' - no matter of expected failures
+        - 'last' - not in expected failure contexts, apart from the last attempt of 'Wait Until Keyword Succeeds'
+        - 'none' - not in expected failure contexts
+        """
+        if policy == 'always' or not self.contexts:
+            return True
+        if policy == 'none':
+            return False
+        return all(context.name == retrying_keyword and context.last_attempt() for context in self.contexts)
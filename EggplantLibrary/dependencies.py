@@ -0,0 +1,242 @@
+"""
+Change based test selection - maps changed eggPlant script files to the Robot tests using them.
+
+The library records which tests called which scripts into a dependency index file during a run,
+if the 'dependency_index' import parameter is set. Scripts called in suite setups and teardowns are recorded
+for all tests of the suite. Scripts calling a changed script (found by its name in the script text)
+are considered changed as well, unless '--no-callers' is given. Other changed files of a suite,
+e.g. images, select all recorded tests of the suite. Changed files outside of the indexed suites are reported.
+
+Usage:
+    python -m EggplantLibrary.dependencies --index dependencies.json SuiteOne.suite/Scripts/Lists/returnList.script
+    git diff --name-only main | python -m EggplantLibrary.dependencies --index dependencies.json --format robot -
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+
+class FileLock:
+    """
+    Lock shared by several processes - an extra file created exclusively next to the locked one.
+    A lock file older than 'stale_after' seconds has been left by a crashed process and is removed.
+    """
+
+    poll_interval = 0.05
+
+    def __init__(self, path, timeout=30.0, stale_after=60.0):
+        self.path = path
+        self.timeout = float(timeout)
+        self.stale_after = float(stale_after)
+
+    def __enter__(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                os.close(os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return self
+            except FileExistsError:
+                try:
+                    if time.time() - os.stat(self.path).st_mtime > self.stale_after:
+                        os.remove(self.path)
+                        continue
+                except OSError:  # released in the meantime
+                    continue
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Lock file {self.path} held by another process for more than {self.timeout} s")
+            time.sleep(self.poll_interval)
+
+    def __exit__(self, *exc_info):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def script_key(suite, file_path):
+    """
+    Returns the index key of the script file - the path starting with the suite folder name,
+    e.g. 'SuiteOne.suite/Scripts/Lists/returnNestedList.script'
+    """
+    relative = os.path.relpath(file_path, suite).replace("\\", "/")
+    return f"{os.path.basename(os.path.normpath(suite))}/{relative}"
+
+
+class DependencyIndex:
+    """
+    Records script usage per test during a run and merges it into the index file.
+    Entries of tests run again are replaced, so scripts not used by a test anymore are removed from the index.
+    The file is merged on saving - so several processes (e.g. pabot) may share it. The merge is done under
+    a lock file and the merged index replaces the file at once, so readers never see a partially written file.
+    A corrupt file is kept as '<file>.corrupt' and replaced by a new index - with a warning.
+    """
+
+    lock_timeout = 30.0
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.scripts = {}  # script key -> set of test long names
+        self.tests = set()  # tests run in this process
+        self.suites = {}  # suite folder name -> path, for finding scripts calling a changed script
+        self.warnings = []
+
+    def record(self, test, key):
+        self.tests.add(test)
+        self.scripts.setdefault(key, set()).add(test)
+
+    def add_suite(self, suite):
+        self.suites[os.path.basename(os.path.normpath(suite))] = suite
+
+    def save(self):
+        if not self.tests:
+            return
+        folder = os.path.dirname(os.path.abspath(self.file_path))
+        os.makedirs(folder, exist_ok=True)
+        with FileLock(f"{self.file_path}.lock", self.lock_timeout):
+            try:
+                index = load_index(self.file_path)
+            except ValueError as e:
+                os.replace(self.file_path, f"{self.file_path}.corrupt")
+                self.warnings.append(f"Dependency index {self.file_path} is corrupt ({e}), "
+                                     f"kept as {self.file_path}.corrupt - a new index is started")
+                index = load_index(self.file_path)
+            scripts = {}
+            for key, tests in index['scripts'].items():
+                remaining = set(tests) - self.tests
+                if remaining:
+                    scripts[key] = remaining
+            for key, tests in self.scripts.items():
+                scripts.setdefault(key, set()).update(tests)
+            index['scripts'] = {key: sorted(tests) for key, tests in sorted(scripts.items())}
+            index['suites'].update(self.suites)
+            temp_path = f"{self.file_path}.{os.getpid()}.tmp"
+            with open(temp_path, "w", encoding="utf8") as f:
+                json.dump(index, f, indent=1)
+            os.replace(temp_path, self.file_path)
+
+    def pop_warnings(self):
+        warnings, self.warnings = self.warnings, []
+        return warnings
+
+
+def load_index(file_path):
+    """
+    :return: the index from the file - an empty one if the file doesn't exist
+    :raises ValueError: if the file is not a valid index
+    """
+    try:
+        with open(file_path, encoding="utf8") as f:
+            index = json.load(f)
+    except FileNotFoundError:
+        index = {}
+    if not isinstance(index, dict) or not all(isinstance(index.get(key, {}), dict) for key in ('scripts', 'suites')):
+        raise ValueError("not a dependency index")
+    index.setdefault('scripts', {})
+    index.setdefault('suites', {})
+    return index
+
+
+def find_callers(index, names):
+    """
+    Returns keys of the indexed scripts calling any of the scripts with the names (transitively) - a script
+    is considered as calling another one if the name of the other script appears as a word in its text
+    """
+    texts = {}
+    for key in index['scripts']:
+        suite = index['suites'].get(key.split("/", 1)[0])
+        if suite:
+            try:
+                with open(os.path.join(suite, key.split("/", 1)[1]), encoding="utf8", errors="replace") as f:
+                    texts[key] = f.read()
+            except OSError:
+                pass
+
+    found = set()
+    pending = list(names)
+    checked = set()
+    while pending:
+        name = pending.pop()
+        if name in checked:
+            continue
+        checked.add(name)
+        pattern = re.compile(r'(?<![\w.])' + re.escape(name) + r'(?!\w)')
+        for key, text in texts.items():
+            if key not in found and pattern.search(text):
+                found.add(key)
+                pending.append(script_name(key))
+    return found
+
+
+def script_name(path):
+    return os.path.splitext(path.replace("\\", "/").rsplit("/", 1)[-1])[0]
+
+
+def select_tests(index, changed_paths, callers=True):
+    """
+    Other changed files of a suite (e.g. images in 'SuiteOne.suite/Images/') may be used by any of its scripts,
+    so all recorded tests of the suite are selected for them.
+    :return: a sorted list of tests using the changed scripts, a list of changed scripts
+    not called by any recorded test directly and a list of changed files not belonging to any indexed suite
+    """
+    keys = set()
+    names = set()
+    unknown = []
+    ignored = []
+    suites = {key.split("/", 1)[0] for key in index['scripts']}
+    for path in changed_paths:
+        normalized = path.strip().replace("\\", "/")
+        if not normalized.endswith(".script"):
+            changed_suites = [suite for suite in suites if f"/{suite}/" in "/" + normalized]
+            if changed_suites:
+                keys.update(key for key in index['scripts'] if key.split("/", 1)[0] in changed_suites)
+            else:
+                ignored.append(path)
+            continue
+        names.add(script_name(normalized))
+        matches = [key for key in index['scripts'] if normalized == key or normalized.endswith("/" + key)]
+        if matches:
+            keys.update(matches)
+        else:
+            unknown.append(path)
+    if callers:
+        keys |= find_callers(index, names)
+    tests = set()
+    for key in keys:
+        tests.update(index['scripts'][key])
+    return sorted(tests), unknown, ignored
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", help="changed files, '-' reads them from stdin")
+    parser.add_argument("--index", required=True, help="dependency index file recorded by the library")
+    parser.add_argument("--format", choices=("names", "robot"), default="names",
+                        help="'robot' prints '--test' options for the robot command")
+    parser.add_argument("--no-callers", action="store_true", help="don't select tests of scripts calling them")
+    args = parser.parse_args(argv)
+
+    paths = [path for path in args.paths if path != "-"]
+    if "-" in args.paths:
+        paths.extend(line.strip() for line in sys.stdin if line.strip())
+
+    try:
+        index = load_index(args.index)
+    except (OSError, ValueError) as e:
+        parser.error(f"can't read the dependency index {args.index}: {e}")
+    tests, unknown, ignored = select_tests(index, paths, callers=not args.no_callers)
+    for path in unknown:
+        print(f"Changed script not called by any recorded test directly: {path}", file=sys.stderr)
+    for path in ignored:
+        print(f"Changed file outside of the indexed suites ignored: {path}", file=sys.stderr)
+    if args.format == "robot":
+        print(" ".join(f'--test "{test}"' for test in tests))
+    else:
+        print("\n".join(tests))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
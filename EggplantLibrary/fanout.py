@@ -0,0 +1,111 @@
+from datetime import datetime
+import os
+import re
+import time
+import xmlrpc.client
+
+from . import utils
+from .transport import create_server_proxy
+
+
+def distribute(connections, instances):
+    """
+    Assigns SUT connections to eggDrive instances round-robin.
+    :return: dict 'eggDrive URI -> list of connections'
+    """
+    groups = {uri: [] for uri in instances}
+    for index, connection in enumerate(connections):
+        groups[instances[index % len(instances)]].append(connection)
+    return {uri: group for uri, group in groups.items() if group}
+
+
+def run_on_instance(uri, suite, command, connections, output_dir, start_session, open_suite=None):
+    """
+    Runs the eggPlant command on each of the SUT connections one after another, using the eggDrive instance
+    with the given URI. Designed to be run in a separate thread per eggDrive instance -
+    each call creates an own XML RPC connection and doesn't log into RF (RF ignores messages of other threads).
+
+    :param start_session: if TRUE, a session with the suite is opened first (previous session is closed)
+    :param open_suite: suite of the session opened on the instance before, closed if another suite is needed
+    :return: a list of result dicts (one per connection), a list of messages to log afterwards
+             and TRUE if the session with the suite is open on the instance
+    """
+    server = create_server_proxy(uri)  # commands are serialized with other threads using the same instance
+    results = []
+    messages = []
+
+    session_error = None
+    if start_session:
+        try:
+            open_session(server, uri, suite, open_suite, messages)
+        except (xmlrpc.client.Fault, OSError) as e:
+            session_error = "Opening the session failed: " + (e.faultString if isinstance(e, xmlrpc.client.Fault)
+                                                               else str(e))
+
+    for connection in connections:
+        result = {'status': 'FAIL', 'return_value': None, 'error': '', 'screenshot': None,
+                  'duration': 0.0, 'eggdrive': uri}
+        if session_error:
+            result['error'] = session_error
+            results.append(result)
+            continue
+        started = time.perf_counter()
+        connected = False
+        try:
+            server.execute(f"connect {connection}")
+            connected = True
+            response = server.execute(command)
+            messages.append(f"{uri} | {connection}: command output:\n{response['Output']}")
+            result_section = response['Result']
+            if result_section['Status'] == "Success":
+                result['status'] = 'PASS'
+                result['return_value'] = utils.auto_convert(result_section['ReturnValue'])
+            else:
+                result['error'] = result_section['ErrorMessage']
+        except (xmlrpc.client.Fault, OSError) as e:
+            result['error'] = e.faultString if isinstance(e, xmlrpc.client.Fault) else str(e)
+        result['duration'] = time.perf_counter() - started
+
+        if result['status'] != 'PASS':
+            if connected:
+                result['screenshot'] = capture_screen(server, connection, output_dir, messages)
+            else:  # the active SUT is still the previous one
+                messages.append(f"{connection}: no screenshot taken, connecting the SUT failed")
+        results.append(result)
+    return results, messages, session_error is None
+
+
+def open_session(server, uri, suite, open_suite, messages):
+    """
+    Opens a session with the suite on the eggDrive instance - the session with the `open_suite` is closed first
+    """
+    if open_suite:
+        try:
+            server.endsession(open_suite)
+        except xmlrpc.client.Fault as e:
+            messages.append(f"{uri}: closing the session with the suite {open_suite} failed: {e.faultString}")
+    try:
+        server.startsession(suite)
+    except xmlrpc.client.Fault as e:
+        if "BUSY: Session in progress" not in e.faultString:
+            raise
+        messages.append(f"{uri}: old session busy - close it automatically")
+        server.endsession(suite)
+        server.startsession(suite)
+
+
+def capture_screen(server, connection, output_dir, messages):
+    """
+    Captures the active SUT screen of the eggDrive instance.
+    :return: the screenshot path relative to the output dir or None if capturing failed
+    """
+    safe_name = re.sub(r'[^\w\-]+', '_', connection).strip('_')[:50]
+    path = "Screenshots\\SUTs__{0}__{1}.png".format(datetime.now().strftime('%Y-%m-%d__%H_%M_%S__%f'), safe_name)
+    full_path = os.path.join(output_dir, path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    try:
+        server.execute("CaptureScreen(Name:\"{0}\")".format(full_path))
+        return path
+    except (xmlrpc.client.Fault, OSError) as e:
+        messages.append(f"{connection}: unable to take screenshot - {e}")
+        return None
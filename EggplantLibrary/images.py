@@ -0,0 +1,116 @@
+import difflib
+import os
+import re
+import time
+
+image_extensions = ('.png', '.tif', '.tiff', '.jpg', '.jpeg', '.bmp', '.gif')
+
+# image references inside eggPlant expressions, e.g. 'imagelocation("OtherCorner")' or 'ImageFound(Image:"Logo")'
+image_function_pattern = re.compile(
+    r'\b(?:imagelocation|imagerectangle|imagefound|imageinfo|everyimagelocation|everyimagerectangle|waitfor'
+    r'|click|doubleclick|rightclick|moveto)\s*\(?\s*(?:\d+(?:\.\d+)?\s*,\s*)?(?:\(\s*)?(?:image(?:name)?\s*:\s*)?'
+    r'"([^"]+)"', re.I)
+
+# image names given directly as a value of a rectangle, e.g. '"TopLeft", imagelocation("OtherCorner")'
+rectangle_image_pattern = re.compile(r'(?:^|,)\s*\(?\s*"([^"]+)"\s*\)?\s*(?=,|$)')
+
+
+def normalize_image_name(name):
+    """
+    Image names are case insensitive, may use both slashes and may have a file extension
+    """
+    name = name.strip().replace("\\", "/").strip("/")
+    if name.lower().endswith(image_extensions):
+        name = os.path.splitext(name)[0]
+    return name.lower()
+
+
+class ImageIndex:
+    """
+    In-memory index of the eggPlant suite 'Images' folder - image names and collections (subfolders).
+
+    The index is refreshed incrementally: only folders with a changed modification time are scanned again,
+    as adding, removing or renaming an image changes the modification time of its folder.
+    Refreshing is throttled to once per `refresh_interval` seconds, unless forced.
+    """
+
+    refresh_interval = 2.0  # seconds
+
+    def __init__(self, images_dir):
+        self.images_dir = images_dir
+        self.folders = {}  # folder path relative to the images dir ('' for the root) -> (mtime, image names)
+        self.names = {}  # normalized image name -> image name as on disk
+        self.collections = {}  # normalized collection name -> collection name as on disk
+        self.last_refresh = None
+
+    def refresh(self, force=False):
+        if not force and self.last_refresh is not None and \
+                time.monotonic() - self.last_refresh < self.refresh_interval:
+            return
+        self.last_refresh = time.monotonic()
+        seen = set()
+        self.refresh_folder("", seen)
+        for folder in set(self.folders) - seen:  # removed folders
+            del self.folders[folder]
+        self.names = {normalize_image_name(name): name for _, names in self.folders.values() for name in names}
+        self.collections = {folder.lower(): folder for folder in self.folders if folder}
+
+    def refresh_folder(self, folder, seen):
+        path = os.path.join(self.images_dir, folder)
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return
+        seen.add(folder)
+        known = self.folders.get(folder)
+        if known and known[0] == mtime:  # unchanged - only the subfolders have to be checked
+            for subfolder in [name for name in self.folders if os.path.dirname(name) == folder and name]:
+                self.refresh_folder(subfolder, seen)
+            return
+
+        names = []
+        with os.scandir(path) as entries:
+            for entry in entries:
+                relative = f"{folder}/{entry.name}" if folder else entry.name
+                if entry.is_dir():
+                    self.refresh_folder(relative, seen)
+                elif entry.name.lower().endswith(image_extensions):
+                    names.append(os.path.splitext(relative)[0])
+        self.folders[folder] = (mtime, names)
+
+    def contains(self, reference):
+        """
+        Checks if the reference is an image or a collection of the suite.
+        Absolute paths are checked on the file system directly.
+        """
+        if os.path.isabs(reference) or re.match(r'^[A-Za-z]:', reference):
+            return os.path.exists(reference)
+        name = normalize_image_name(reference)
+        self.refresh()
+        if name in self.names or name in self.collections:
+            return True
+        self.refresh(force=True)  # the image might have been just captured
+        return name in self.names or name in self.collections
+
+    def suggest(self, reference, count=3):
+        """
+        Returns names of images and collections close to the reference
+        """
+        name = normalize_image_name(reference)
+        candidates = {**self.names, **self.collections}
+        return [candidates[match] for match in difflib.get_close_matches(name, list(candidates), n=count, cutoff=0.6)]
+
+
+def find_image_references(text):
+    """
+    Returns image names referenced in an eggPlant expression, e.g. 'imagelocation("OtherCorner")'
+    """
+    return image_function_pattern.findall(text)
+
+
+def find_rectangle_image_references(rectangle):
+    """
+    Returns image names referenced in an eggPlant rectangle - given directly or inside of image functions.
+    Other quoted strings, e.g. 'textlocation("Hello")', are not image names.
+    """
+    return rectangle_image_pattern.findall(rectangle) + find_image_references(rectangle)
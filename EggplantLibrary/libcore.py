@@ -1,20 +1,77 @@
 from datetime import datetime
+import functools
 import inspect
 import xmlrpc.client
 import os
+import re
+import socket
+import threading
+import time
 
 import robot.api.logger as log
 from robot.libraries.BuiltIn import BuiltIn
 
-draw_rects_on_screenshots = True
-try:
-    from PIL import Image, ImageDraw
-except ModuleNotFoundError as e:
-    log.warn(f"Pillow not found, drawing rectangles on screenshots is disabled: {e}."    
-    " Install using: 'pip install Pillow'.")
-    draw_rects_on_screenshots = False
+from . import output, utils
+from .cache import ResultCache
+from .contexts import ExpectedFailureContexts
+from .dependencies import DependencyIndex, script_key
+from .images import ImageIndex, find_image_references, find_rectangle_image_references
+from .profiling import KeywordProfiler
+from .resources import get_sampler, save_samples
+from .retry import describe_fault, retry_log
+from .timing import DurationStore
+from .tracing import get_tracer, no_span
+from .transport import client_uri, create_server_proxy
 
-from . import utils
+# Pillow is imported on first use only - see 'load_pillow'
+pillow = None
+
+
+def load_pillow():
+    """
+    Imports Pillow when it's needed for the first time, e.g. for drawing rectangles on screenshots.
+    Returns a tuple of the modules (Image, ImageDraw) or None if Pillow isn't installed.
+    """
+    global pillow
+    if pillow is None:
+        try:
+            from PIL import Image, ImageDraw
+            pillow = (Image, ImageDraw)
+        except ModuleNotFoundError as e:
+            log.warn(f"Pillow not found, drawing rectangles on screenshots is disabled: {e}."
+                     " Install using: 'pip install Pillow'.")
+            pillow = False
+    return pillow or None
+
+
+def traced(category):
+    """
+    Decorator recording a trace span for each call of the library method - if tracing is enabled
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.tracer is None:
+                return method(self, *args, **kwargs)
+            with self.tracer.span(method.__name__, category):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@functools.lru_cache(maxsize=8)
+def parse_config(file_path, mtime):
+    """
+    Parses the config file into a dict 'key -> value'. Lines without '=' (e.g. comments) are ignored.
+    The result is cached - the file is read again only if it's modification time changes.
+    """
+    config = {}
+    with open(file_path, encoding="utf8") as f:
+        for line in f:
+            if "=" in line:
+                key, value = line.split('=', 1)
+                config.setdefault(key.strip(), value.strip())
+    return config
 
 
 class EggplantExecutionException(Exception):
@@ -23,9 +80,36 @@ class EggplantExecutionException(Exception):
     """
 
 
+class RunState(threading.local):
+    """
+    State of the eggPlant script being run - kept per thread, as several threads may run scripts at the same time
+    """
+
+    def __init__(self):
+        self.current_script = None  # the eggPlant keyword being run, for attributing the command timings
+        self.last_script_duration = None
+
+
 class EggplantLibDynamicCore:
 
-    def __init__(self, suite='', host='', port='', scripts_dir=''):
+    ROBOT_LISTENER_API_VERSION = 2
+
+    execution_modes = ('RunWithNewResults', 'lightweight')
+    image_check_modes = ('off', 'warn', 'strict')
+    diagnostics_policies = ('always', 'last', 'none')
+    lightweight_tag = 'lightweight'
+    cache_tag = 'cache'
+    cache_default_ttl = 300
+    chunked_tag = 'chunked'
+    chunk_size = 1000000  # characters
+    diagnostics_timeout = 30  # seconds, for taking a screenshot after an adaptive timeout
+    log_file_tail_bytes = 65536  # max. size of the eggPlant log file tail logged on failure
+    # return type declaration in the script documentation, e.g. 'Returns: list[str]' - not a free text description
+    return_type_pattern = re.compile(r'returns:\s*((?:list\s*\[\s*)*\w+(?:\s*\])*)$', re.I)
+
+    def __init__(self, suite='', host='', port='', scripts_dir='', execution_mode='', profiling='',
+                 adaptive_timeouts='', tracing='', image_check='', command_timings='', dependency_index='',
+                 expected_failure_diagnostics='', resource_sampling='', broker='', broker_priority=''):
         """
         Each library import is bound to a single *eggPlant test suite* and to an *eggPlant instance running in the eggDrive mode*.
         
@@ -50,6 +134,9 @@ class EggplantLibDynamicCore:
         - The default value is a first `.suite` file in the library folder.
         - You can also select another eggPlant suite for actual execution using `Open Session` and `Close Session` keywords.   
         - If eggPlant runs on a remote server,input here a path from the library host, not relative to the server! And it must be reachable.   
+        - Several suites may be separated with `;`. Their keywords are namespaced by the suite name then,
+        e.g. `SuiteOne.Lists.returnNestedList`. The first suite is the default one. A keyword from another suite
+        switches the eggDrive session to its suite automatically - the session is opened lazily on the first call.
 
         === host ===
         Host name or IP address of the eggPlant instance running in the eggDrive mode (i.e. XMLRPC server).  
@@ -66,12 +153,105 @@ class EggplantLibDynamicCore:
         Folder inside the eggPlant Suite, where all scripts are located.
         - The default value is `Scripts`.
         - Subfolders are supported.
+
+        === execution_mode ===
+        How eggPlant scripts are executed.
+        - `RunWithNewResults` (default) - each script call creates an eggPlant results folder with a log file.
+        - `lightweight` - scripts are called directly without creating results, which is much faster
+        for small scripts called very often. The script return value and exceptions are still captured,
+        but errors logged in eggPlant without an exception (e.g. using `LogError`) are not detected.
+        - Single scripts can use the lightweight mode with the `lightweight` tag in the last line
+        of the script documentation, e.g. `Tags: lightweight`.
+
+        === profiling ===
+        Enables profiling of keyword calls - for finding out where the time goes in slow keywords.
+        - `cpu` - cProfile statistics per keyword, time spent waiting for eggDrive is measured separately.
+        - `memory` - top memory allocations per keyword using tracemalloc.
+        - `cpu, memory` - both.
+        - Disabled by default. The default value may be set using the `EGGPLANT_LIBRARY_PROFILING` environment variable.
+        - The `.pstats` files and the summary are saved into the `Profiling` folder in the RF output dir at the suite end.
+
+        === adaptive_timeouts ===
+        Path to a JSON file storing observed durations of eggPlant scripts, relative to the current working dir.
+        If set, each script call gets a timeout computed from its previous durations - so a hung script fails early.
+        - The timeout is the p99 duration multiplied by a factor, limited by a floor and a ceiling.
+        Scripts without enough history get the ceiling. See `Set Adaptive Timeouts` for the default values.
+        - Disabled by default.
+
+        === tracing ===
+        Records a timeline of the library activity in the Chrome trace event format - keywords, eggDrive round trips,
+        screenshots, log and video processing - to be opened in [https://ui.perfetto.dev|Perfetto] or `chrome://tracing`.
+        - `True` enables tracing, disabled by default. The default value may be set
+        using the `EGGPLANT_LIBRARY_TRACING` environment variable.
+        - Each process writes the `Traces/eggplant_trace_<pid>.json` file in the RF output dir at the suite end.
+        Trace files of parallel processes (e.g. pabot) can be merged using `python -m EggplantLibrary.tracing`.
+
+        === image_check ===
+        Checks image references against the `Images` folder of the suite before sending a command to eggPlant -
+        so a typo in an image name fails immediately instead of after an image search timeout.
+        - `off` (default) - no check.
+        - `warn` - unknown images are logged as warnings, including similar image names.
+        - `strict` - the keyword fails with unknown images, including similar image names in the error message.
+        - Checked are arguments of eggPlant scripts with `image` in the parameter name, image functions in arguments
+        and commands (e.g. `imagelocation("OtherCorner")` or `click "someImage"`) and `Screenshot` rectangles.
+
+        === command_timings ===
+        `True` measures the time spent per SenseTalk command (e.g. `click`, `waitFor`, `readText`) inside each script,
+        using the timestamps of the eggPlant output. Disabled by default.
+        - The report of the slowest commands in the run is logged at the suite end
+        and saved into `eggplant_command_timings.txt` in the RF output dir.
+
+        === dependency_index ===
+        Path to a JSON file recording which tests called which eggPlant scripts, relative to the current working dir.
+        Scripts called in suite setups and teardowns are recorded for all tests of the suite.
+        The tests affected by changed scripts can be selected using `python -m EggplantLibrary.dependencies`.
+        - Disabled by default. The file is merged on saving under a lock file (`<file>.lock`),
+        so parallel processes (e.g. pabot) may share it.
+
+        === expected_failure_diagnostics ===
+        Failure diagnostics (OCR debug info, screenshot, video) of eggPlant scripts failing inside of constructs
+        expecting failures - `Run Keyword And Return Status`, `Run Keyword And Ignore Error`,
+        `Run Keyword And Expect Error`, `Wait Until Keyword Succeeds` and the TRY branch of TRY/EXCEPT.
+        - `always` (default) - the diagnostics are done for each failure.
+        - `last` - only on the last attempt of `Wait Until Keyword Succeeds`, not in other constructs.
+        - `none` - no diagnostics inside of these constructs. Saves many eggDrive round trips in polling loops.
+
+        === resource_sampling ===
+        Interval in seconds for sampling resources of the eggPlant process (CPU, RSS, handles) and of the suite
+        `Results` folder (size, number of runs) in a background thread, `True` samples every 10 seconds.
+        Disabled by default.
+        - eggPlant has to run on the same machine, process metrics need `psutil` (`pip install psutil`).
+        - Samples are linked to the running keywords. Warnings are logged if the memory or handle usage
+        of eggPlant grows steadily - a good time to restart eggPlant.
+        - A summary is logged at the suite end, the samples of all suites are saved into `eggplant_resources.csv`
+        in the RF output dir.
+
+        === broker ===
+        Path of the Unix socket of a local eggDrive broker (`python -m EggplantLibrary.broker`).
+        If set, the library doesn't connect to eggDrive directly - the broker shares the eggDrive instances
+        between several Robot processes (e.g. pabot workers), so they don't close sessions of each other.
+        `host` and `port` are ignored then. Needs Unix sockets, so not available on Windows.
+        `Set eggDrive Pool` and `Run Script On SUTs` connect to eggDrive directly and can't be used with the broker.
+
+        === broker_priority ===
+        Priority of the Robot process waiting for an eggDrive instance of the broker - higher first. Default is 0.
         """
 
         # Get all params from the library import string first.
         # If some of the empty, try to look in a config file.
         # If nothing found, use default values
-        params = {'host': 'http://127.0.0.1', 'port': '5400', 'scripts_dir': 'Scripts', 'suite': suite}  # defaults
+        params = {'host': 'http://127.0.0.1', 'port': '5400', 'scripts_dir': 'Scripts', 'suite': suite,
+                  'execution_mode': 'RunWithNewResults',
+                  'profiling': os.environ.get('EGGPLANT_LIBRARY_PROFILING', ''),
+                  'adaptive_timeouts': '',
+                  'tracing': os.environ.get('EGGPLANT_LIBRARY_TRACING', ''),
+                  'image_check': 'off',
+                  'command_timings': '',
+                  'dependency_index': '',
+                  'expected_failure_diagnostics': 'always',
+                  'resource_sampling': '',
+                  'broker': os.environ.get('EGGPLANT_LIBRARY_BROKER', ''),
+                  'broker_priority': '0'}  # defaults
         for p_key in params:
             if locals()[p_key] == '':  # if parameter value passed to the lib constructor is empty..
                 value_from_config = self.read_from_config(p_key)
@@ -81,33 +261,146 @@ class EggplantLibDynamicCore:
                 params[p_key] = locals()[p_key]  # otherwise set the passed argument value
 
         uri = params['host'] + ":" + params['port']
-        self.eggplant_server = xmlrpc.client.ServerProxy(uri)
+        self.eggdrive_uri = uri
+        self.broker = params['broker']
+        if self.broker:
+            if not hasattr(socket, 'AF_UNIX'):
+                raise ValueError("The eggDrive broker needs Unix sockets, which are not available on this platform - "
+                                 "remove the 'broker' import parameter or the EGGPLANT_LIBRARY_BROKER variable")
+            # all library instances of the process share the lease of the broker, like a direct eggDrive session
+            self.eggplant_server = create_server_proxy(client_uri(f"{socket.gethostname()}-{os.getpid()}",
+                                                                  params['broker_priority']),
+                                                       socket_path=self.broker)
+        else:
+            self.eggplant_server = create_server_proxy(uri)
 
-        # Now check if the eggPlant suite path is set
-        self.eggplant_suite = params['suite']
-        this_dir = os.path.abspath(os.path.dirname(__file__))
+        # Additional eggDrive instances for running scripts on several SUTs concurrently - see 'Set eggDrive Pool'
+        self.eggdrive_pool = []
+        self.pool_sessions = {}  # URI -> suite of the session opened by the library on pool instances
 
-        # if suite path still not set, use first ".suite" dir in the library folder
-        if self.eggplant_suite == '':
-            for name in os.listdir(this_dir):
-                if name.endswith(".suite"):
-                    self.eggplant_suite = os.path.abspath(os.path.join(this_dir, name))
-                    break
-        # otherwise suite path is set, but make sure it's absolute
-        else:
-            if not os.path.isabs(self.eggplant_suite):
-                self.eggplant_suite = os.path.abspath(os.path.join(this_dir, self.eggplant_suite))
+        # Now check if the eggPlant suite path is set - several suites may be separated with ';'
+        this_dir = os.path.abspath(os.path.dirname(__file__))
+        self.eggplant_suites = {}  # suite name -> suite path, the first suite is the default one
+        for suite_path in [path.strip() for path in params['suite'].split(';') if path.strip()] or ['']:
+            # if suite path still not set, use first ".suite" dir in the library folder
+            if suite_path == '':
+                for name in os.listdir(this_dir):
+                    if name.endswith(".suite"):
+                        suite_path = os.path.abspath(os.path.join(this_dir, name))
+                        break
+            # otherwise suite path is set, but make sure it's absolute
+            else:
+                if not os.path.isabs(suite_path):
+                    suite_path = os.path.abspath(os.path.join(this_dir, suite_path))
+            suite_name = os.path.splitext(os.path.basename(suite_path.rstrip("/\\")))[0]
+            if suite_name in self.eggplant_suites:
+                raise ValueError(f"Several eggPlant suites named '{suite_name}' - suite names must be unique")
+            self.eggplant_suites[suite_name] = suite_path
+        self.eggplant_suite = next(iter(self.eggplant_suites.values()))
+
+        # keywords of several suites are namespaced by the suite name, e.g. 'SuiteOne.Lists.returnNestedList'
+        self.multi_suite = len(self.eggplant_suites) > 1
+        self.active_suite = None  # suite of the open eggDrive session, for switching sessions between suites
 
         # TODO: if the eggPlant runs on a remote server, the test suite dir will be remote as well! How access it?
 
         # the default directory with keywords (=eggPlant scripts) is 'Scripts' inside the eggPlant test suite
-        self.keywords_dir = os.path.join(self.eggplant_suite, params['scripts_dir'])
+        self.scripts_dir = params['scripts_dir']
+        self.keywords_dir = os.path.join(self.eggplant_suite, self.scripts_dir)
+
+        self.execution_mode = params['execution_mode']
+        if self.execution_mode not in self.execution_modes:
+            raise ValueError(f"Unknown execution mode '{self.execution_mode}', "
+                             f"supported are: {', '.join(self.execution_modes)}")
+
+        self.profiler = None
+        profiling_modes = [mode.strip().lower() for mode in params['profiling'].split(',') if mode.strip()]
+        if profiling_modes and profiling_modes != ['false']:
+            self.profiler = KeywordProfiler(cpu='memory' not in profiling_modes or 'cpu' in profiling_modes,
+                                            memory='memory' in profiling_modes)
+
+        self.image_check = params['image_check'].lower()
+        if self.image_check not in self.image_check_modes:
+            raise ValueError(f"Unknown image check mode '{self.image_check}', "
+                             f"supported are: {', '.join(self.image_check_modes)}")
+        self.image_indexes = {}  # suite path -> ImageIndex, built on first use
+
+        # Time spent per SenseTalk command, shared by all library instances in the process
+        self.command_timings = None
+        if str(params['command_timings']).strip().lower() not in ('', 'false', '0', 'no', 'off'):
+            self.command_timings = output.command_timings
+        self.run_state = RunState()
+
+        # Scripts called by each test - for change based test selection
+        self.dependency_index = None
+        if params['dependency_index']:
+            self.dependency_index = DependencyIndex(os.path.abspath(params['dependency_index']))
+            for suite_path in self.eggplant_suites.values():
+                self.dependency_index.add_suite(suite_path)
+        self.suite_tests = []  # tests run in the suite
+        self.suite_level_scripts = set()  # scripts called outside of tests, e.g. in the suite setup
+
+        # Diagnostics of failures inside of 'Run Keyword And Return Status' etc.
+        self.expected_failure_diagnostics = params['expected_failure_diagnostics'].lower()
+        if self.expected_failure_diagnostics not in self.diagnostics_policies:
+            raise ValueError(f"Unknown expected failure diagnostics policy '{self.expected_failure_diagnostics}', "
+                             f"supported are: {', '.join(self.diagnostics_policies)}")
+        self.expected_failures = None
+        if self.expected_failure_diagnostics != 'always':
+            self.expected_failures = ExpectedFailureContexts()
+
+        # Resources of the eggPlant process and the Results folder - the sampler is shared by instances of the suite
+        self.sampler = None
+        resource_sampling = str(params['resource_sampling']).strip().lower()
+        if resource_sampling not in ('', 'false', '0', 'no', 'off'):
+            interval = None  # the default
+            if resource_sampling not in ('true', 'yes', 'on'):
+                try:
+                    interval = float(resource_sampling)
+                except ValueError:
+                    raise ValueError(f"Invalid resource sampling interval '{params['resource_sampling']}', "
+                                     f"expected are seconds or True") from None
+            self.sampler = get_sampler(os.path.join(self.eggplant_suite, "Results"), interval)
+            self.sampler.start()
+
+        # Timeline of the library activity - the tracer is shared by all library instances in the process
+        self.tracer = None
+        if str(params['tracing']).strip().lower() not in ('', 'false', '0', 'no', 'off'):
+            self.tracer = get_tracer()
+
+        # Script durations for adaptive timeouts
+        self.duration_store = None
+        if params['adaptive_timeouts']:
+            self.duration_store = DurationStore(os.path.abspath(params['adaptive_timeouts']))
+
+        # Top comments of scripts, cached by the script file path: {path: (modification time, comments)}
+        self.top_comments_cache = {}
+
+        self.output_dir = None  # RF output dir, resolved on first use
 
         # For video recording
         self.current_movie_path = None
+        self.movie_segments = None  # for the segmented recording mode only, see 'Start Segmented Movie'
+        self.movie_segment_options = None  # (fps, compression rate, highlighting, extra time)
 
         self.eggplant_version_checked = False
 
+        # Retention policy for the eggPlant 'Results' folder - see 'Set Results Retention Policy'
+        self.results_retention = None
+
+        # Retries of transient eggDrive faults - see 'Set Retry Policy', disabled by default
+        self.retry_policy = None
+        self.keyword_retry_policies = {}  # normalized keyword name -> policy
+        self.retry_test_budget = 10  # max. retries per test
+        self.retry_budget_left = self.retry_test_budget
+        self.current_test = None
+
+        # Return values of scripts with the 'cache' tag
+        self.result_cache = ResultCache()
+
+        # the library listens to RF events itself, e.g. for logging statistics at suite end
+        self.ROBOT_LIBRARY_LISTENER = self
+
     # ---------- RobotFramework API implementation ------------
     def get_keyword_names(self):
         """
@@ -126,13 +419,41 @@ class EggplantLibDynamicCore:
                 keywords.append(name)
 
         # now fetch eggPlant scripts and add them as keywords - from all subfolders
-        self.get_scripts_from_folder(self.keywords_dir, keywords)
+        if self.multi_suite:
+            from concurrent.futures import ThreadPoolExecutor
+
+            # suites are scanned concurrently, the suite name is the first prefix of the keywords
+            with ThreadPoolExecutor(max_workers=len(self.eggplant_suites)) as executor:
+                scans = executor.map(
+                    lambda suite: self.get_scripts_from_folder(os.path.join(suite[1], self.scripts_dir),
+                                                               prefix=suite[0]),
+                    self.eggplant_suites.items())
+                for scripts in scans:
+                    keywords.extend(scripts)
+        else:
+            self.get_scripts_from_folder(self.keywords_dir, keywords)
 
         log.debug("Found keywords: {}".format(keywords))
 
         return keywords
 
     def run_keyword(self, name, args):
+        """
+        Runs the requested keyword with the specified arguments - see 'call_keyword'.
+        Profiling data and the trace span are recorded here, if enabled.
+        """
+        if self.sampler:
+            self.sampler.current_keyword = name
+        try:
+            with self.trace(name, 'keyword'):
+                if self.profiler:
+                    return self.profiler.run(name, self.call_keyword, name, args)
+                return self.call_keyword(name, args)
+        finally:
+            if self.sampler:
+                self.sampler.current_keyword = None
+
+    def call_keyword(self, name, args):
         """
         Runs the requested keyword with the specified arguments.
         For static keyword just the Python function is called using reflection.
@@ -153,21 +474,61 @@ class EggplantLibDynamicCore:
             return _keyword(*args)
 
         else:  # otherwise it's an eggPlant script
-            command = name
+            with self.eggplant_server.lock:  # the recording is shared by all threads using the session
+                if self.movie_segments and self.movie_segments.rotation_due():
+                    self.rotate_movie_segment()
+
+            suite, command = self.split_suite_name(name)
+            if self.image_check != 'off':
+                self.check_image_references(suite, self.get_image_arguments(name, args))
+            if self.dependency_index:
+                key = script_key(suite, self.get_script_file_path(name))
+                if self.current_test:
+                    self.dependency_index.record(self.current_test, key)
+                else:
+                    self.suite_level_scripts.add(key)
+            if self.multi_suite:
+                self.activate_suite(suite)
             if "." in command:  # if it's a script in a subfolder
                 command = command.replace(".", "/")
+            tags = self.get_script_tags(name)
+            cache_ttl = self.get_cache_ttl(tags)
+            if cache_ttl:
+                cache_key = (name, self.format_arguments(*args))
+                found, result = self.result_cache.get(cache_key)
+                if found:
+                    log.info("Return value from the result cache: {}".format(result))
+                    return result
+            else:
+                # a script without the cache tag might change the SUT state - the cached values are outdated
+                self.result_cache.invalidate()
+
+            deadline = None
+            if self.duration_store:
+                deadline = self.duration_store.deadline(name)
+                log.debug(f"Adaptive timeout: {deadline:.1f} seconds")
+                self.eggplant_server('transport').timeout = deadline
+
+            self.run_state.current_script = name
+            self.run_state.last_script_duration = None
             try:
-                result = self.run_with_new_results(command, *args)
+                result = self.run_with_retries(name, self.run_script, command, tags,
+                                               self.get_return_converter(name), *args)
+                if cache_ttl:
+                    self.result_cache.put(cache_key, result, cache_ttl)
+                if self.duration_store and self.run_state.last_script_duration:
+                    self.duration_store.add(name, self.run_state.last_script_duration)
                 return result
 
             # Failure in parsed result string
             except EggplantExecutionException as e:
-                search_rect = self.log_ocr_debug_info(str(e))
-                screenshot = self.take_screenshot(highlight_rectangle=search_rect, error_if_no_sut=False)
-                if self.current_movie_path:
-                    self.log_embedded_video(self.current_movie_path, screenshot)
-                elif screenshot:
-                    self.log_embedded_image(screenshot)
+                if self.failure_diagnostics_allowed():
+                    search_rect = self.log_ocr_debug_info(str(e))
+                    screenshot = self.take_screenshot(highlight_rectangle=search_rect, error_if_no_sut=False)
+                    if self.current_movie_path:
+                        self.log_failure_video(screenshot)
+                    elif screenshot:
+                        self.log_embedded_image(screenshot)
 
                 raise Exception(f"{name}: {e}")
 
@@ -175,19 +536,167 @@ class EggplantLibDynamicCore:
             except xmlrpc.client.Fault as e:
                 log.error("{}: XMLRPC execution failure! Fault code:{}. Fault string: {}".format(name, e.faultCode,
                                                                                                  e.faultString))
-                screenshot = self.take_screenshot(error_if_no_sut=False)
-                if self.current_movie_path:
-                    self.log_embedded_video(self.current_movie_path, screenshot)
-                else:
-                    self.log_embedded_image(screenshot)
+                if self.failure_diagnostics_allowed():
+                    screenshot = self.take_screenshot(error_if_no_sut=False)
+                    if self.current_movie_path:
+                        self.log_failure_video(screenshot)
+                    else:
+                        self.log_embedded_image(screenshot)
                 raise e
 
+            # no eggDrive response within the adaptive timeout
+            except socket.timeout:
+                log.error(f"{name}: no response from eggPlant within the adaptive timeout of {deadline:.0f} seconds")
+                if self.failure_diagnostics_allowed():
+                    self.eggplant_server('transport').timeout = self.diagnostics_timeout
+                    try:
+                        screenshot = self.take_screenshot(error_if_no_sut=False)
+                    except (socket.timeout, xmlrpc.client.Fault) as screenshot_error:
+                        log.warn(f"Unable to take a screenshot after the timeout: {screenshot_error}")
+                        screenshot = None
+                    if self.current_movie_path:
+                        self.log_failure_video(screenshot)
+                    elif screenshot:
+                        self.log_embedded_image(screenshot)
+                raise Exception(f"{name}: eggPlant script timed out after {deadline:.0f} seconds (adaptive timeout)")
+
             except Exception as e:
                 log.error("Unknown error occurred! {}".format(e))
                 # assuming we don't need a screenshot if it's not an egPlant exception
                 # self.screenshot()
                 raise e
 
+            finally:
+                self.run_state.current_script = None
+                if deadline:
+                    self.eggplant_server('transport').timeout = None
+
+    def failure_diagnostics_allowed(self):
+        """
+        Checks if failure diagnostics (OCR info, screenshot, video) should be done - they may be skipped inside
+        of constructs expecting failures, see the 'expected_failure_diagnostics' import parameter
+        """
+        if self.expected_failures is None or \
+                self.expected_failures.diagnostics_allowed(self.expected_failure_diagnostics):
+            return True
+        log.info("Failure diagnostics skipped - the failure is expected here")
+        return False
+
+    def run_script(self, command, tags, converter, *args):
+        """
+        Runs the eggPlant script in the execution mode matching its tags.
+        The result is converted using the converter - chunked results are parsed incrementally.
+        """
+        if self.chunked_tag in tags:
+            return self.run_chunked(command, *args, converter=converter)
+        if self.execution_mode == 'lightweight' or self.lightweight_tag in tags:
+            return self.run_lightweight(command, *args, converter=converter)
+        return self.run_with_new_results(command, *args, converter=converter)
+
+    def run_with_retries(self, name, function, *args):
+        """
+        Calls the function and retries it in case of transient eggDrive faults - according to the retry policy
+        of the keyword `name` and as long as the retry budget of the current test is not exhausted.
+        """
+        policy = self.keyword_retry_policies.get(name.lower().replace(" ", "").replace("_", ""), self.retry_policy)
+        attempt = 1
+        while True:
+            try:
+                return function(*args)
+            except (xmlrpc.client.Fault, ConnectionError) as e:
+                if policy is None or attempt >= policy.max_attempts or not policy.is_transient(e):
+                    raise
+                if self.retry_budget_left <= 0:
+                    log.info(f"Retry budget of {self.retry_test_budget} retries per test exhausted")
+                    raise
+                fault = describe_fault(e)
+                delay = policy.delay(attempt)
+                log.warn(f"{name}: transient eggDrive fault, retry {attempt}/{policy.max_attempts - 1} "
+                         f"in {delay:.1f} s - {fault}")
+                retry_log.record(self.current_test or "(outside tests)", name, fault, delay)
+                self.retry_budget_left -= 1
+                time.sleep(delay)
+                attempt += 1
+
+    # ---------- RobotFramework listener API implementation ------------
+    def _start_test(self, name, attrs):
+        self.current_test = attrs['longname']
+        self.suite_tests.append(self.current_test)
+        self.retry_budget_left = self.retry_test_budget
+        if self.tracer:
+            self.tracer.begin(name)
+
+    def _start_keyword(self, name, attrs):
+        if self.tracer:
+            self.tracer.begin(name)
+        if self.expected_failures:
+            self.expected_failures.start_keyword(attrs)
+
+    def _end_keyword(self, name, attrs):
+        if self.tracer:
+            self.tracer.end('robot', {'status': attrs['status']})
+        if self.expected_failures:
+            self.expected_failures.end_keyword(attrs)
+
+    def _end_test(self, name, attrs):
+        self.current_test = None
+        if self.sampler:
+            for warning in self.sampler.pop_warnings():
+                log.warn(warning)
+        if self.tracer:
+            self.tracer.end('test', {'status': attrs['status']})
+        if self.movie_segments:
+            if attrs['status'] == 'PASS':
+                self.movie_segments.discard_finished()
+            else:
+                self.movie_segments.pin_window()
+
+    def _end_suite(self, name, attrs):
+        self.finish_results_retention()
+        if self.sampler:
+            for warning in self.sampler.pop_warnings():
+                log.warn(warning)
+            log.info(self.sampler.summary(self.sampler.pop_unreported()))
+            save_samples(os.path.join(self.get_output_dir(), "eggplant_resources.csv"))
+        if self.dependency_index:
+            for key in self.suite_level_scripts:
+                for test in self.suite_tests:
+                    self.dependency_index.record(test, key)
+            self.dependency_index.save()
+            for warning in self.dependency_index.pop_warnings():
+                log.warn(warning)
+        if self.command_timings and self.command_timings.timings:
+            report = self.command_timings.report()
+            log.info(report)
+            with open(os.path.join(self.get_output_dir(), "eggplant_command_timings.txt"), "w", encoding="utf8") as f:
+                f.write(report)
+        suite_retries = retry_log.pop_unreported()
+        if suite_retries:
+            log.info(retry_log.summary(suite_retries))
+            with open(os.path.join(self.get_output_dir(), "eggplant_retries.txt"), "w", encoding="utf8") as f:
+                f.write(retry_log.summary())
+        if self.duration_store:
+            self.duration_store.save()
+        if self.result_cache.hits or self.result_cache.misses:
+            log.info(self.result_cache.stats())
+        if self.profiler and self.profiler.calls:
+            folder = os.path.join(self.get_output_dir(), "Profiling",
+                                  "".join(c if c.isalnum() else "_" for c in attrs['longname']))
+            summary_path = self.profiler.dump(folder)
+            log.info(self.profiler.summary())
+            log.info(f"Profiling data saved into: {summary_path}")
+        if self.tracer and self.tracer.events:
+            trace_path = self.tracer.save(os.path.join(self.get_output_dir(), "Traces"))
+            log.info(f"Trace saved into: {trace_path}")
+
+    def trace(self, name, category='library', args=None):
+        """
+        Returns a context manager recording a trace span - or a no-op one if tracing is disabled
+        """
+        if self.tracer is None:
+            return no_span
+        return self.tracer.span(name, category, args)
+
     # def get_keyword_tags(self, name):
     # we'd need this function if keyword tags would be fetched otherwise as via last docs line.
     # See http://robotframework.org/robotframework/latest/RobotFrameworkUserGuide.html#getting-keyword-tags
@@ -329,16 +838,111 @@ class EggplantLibDynamicCore:
         return result
 
     # ---------- Helper methods ---------------------------------
-    def run_with_new_results(self, script, *args):
+    @traced('execution')
+    def run_with_new_results(self, script, *args, converter=utils.auto_convert):
         """
         Builds an eggPlant command using 'RunWithNewResults' from the script and the arguments and executes it.
         :param script: the script or command to be run
         :param args: arguments. String arguments with spaces inside will be surrounded with quotes (") automatically.
         eggPlant list syntax is supported - like 'script (1, "val2", "3", val4)'
+        :param converter: function converting the result string, see 'get_return_converter'
         :return: the execution result
         """
 
-        command = "RunWithNewResults \"{}\",".format(script)
+        command = "RunWithNewResults \"{}\",{}".format(script, self.format_arguments(*args))
+        result = self.execute(command, parse_result=True)
+        return converter(result)  # The result is always a string so we should try to convert it first
+
+    @traced('execution')
+    def run_lightweight(self, script, *args, converter=utils.auto_convert):
+        """
+        Runs the script directly, without 'RunWithNewResults' - so no eggPlant results folder and log file are created.
+        The script call is wrapped into SenseTalk code, which catches possible exceptions and returns a property list
+        looking like the 'RunWithNewResults' result: (Status, ReturnValue, ErrorMessage, Duration).
+        So the response can be parsed the same way.
+        :param script: the script to be run
+        :param args: arguments, formatted the same way as in 'run_with_new_results'
+        :param converter: function converting the result string, see 'get_return_converter'
+        :return: the execution result
+        """
+        arguments = self.format_arguments(*args).rstrip(',')
+        if arguments:
+            arguments = "," + arguments
+        command = "\n".join([
+            'put the seconds into rfLightweightStart',
+            'try',
+            '    run "{}"{}'.format(script, arguments),
+            '    put the result into rfLightweightReturn',
+            '    return (Status:"Success", ReturnValue:rfLightweightReturn as text, '
+            'Duration:the seconds - rfLightweightStart)',
+            'catch rfLightweightException',
+            '    return (Status:"Failure", ReturnValue:"", '
+            'ErrorMessage:rfLightweightException.name & " -- " & rfLightweightException.reason, '
+            'Duration:the seconds - rfLightweightStart)',
+            'end try'])
+        result = self.execute(command, parse_result=True)
+        return converter(result)
+
+    @traced('execution')
+    def run_chunked(self, script, *args, converter=utils.auto_convert):
+        """
+        Runs the script using 'RunWithNewResults', but the return value is not sent back in the XML RPC response.
+        It's stored in a global eggPlant variable instead and retrieved in slices of 'chunk_size' characters,
+        which are parsed incrementally - so the memory usage stays bounded for very large results.
+        The value itself is not logged, only its length.
+        :param script: the script to be run
+        :param args: arguments, formatted the same way as in 'run_with_new_results'
+        :param converter: function converting the result string, see 'get_return_converter' - a declared return type
+                          is applied while parsing the chunks
+        :return: the execution result, converted into a Python list if it's a list
+        """
+        command = "\n".join([
+            'RunWithNewResults "{}",{}'.format(script, self.format_arguments(*args)),
+            'put the result into rfChunkedResult',
+            'put rfChunkedResult.ReturnValue into global rfChunkedValue',
+            'set rfChunkedResult.ReturnValue to the length of global rfChunkedValue',
+            'return rfChunkedResult'])
+        parser = getattr(converter, 'create_parser', utils.IncrementalListParser)()
+        with self.eggplant_server.lock:  # other threads must not run the same sequence meanwhile
+            length = int(float(self.execute(command, parse_result=True) or 0))
+            try:
+                for start in range(1, length + 1, self.chunk_size):
+                    end = min(start + self.chunk_size - 1, length)
+                    # sent directly, not via 'execute' - the chunks should not be logged
+                    chunk = self.eggplant_server.execute(
+                        f'return characters {start} to {end} of global rfChunkedValue')
+                    parser.feed(str(chunk['Result']))
+                result = parser.close()
+            except ValueError as e:
+                if not hasattr(converter, 'declaration'):
+                    raise
+                raise ValueError(f"The script result doesn't match the declared return type "
+                                 f"'{converter.declaration}': {e}") from None
+            finally:
+                self.eggplant_server.execute('put empty into global rfChunkedValue')
+        log.info(f"Return value retrieved in chunks: {length} characters, "
+                 f"{(length + self.chunk_size - 1) // self.chunk_size} chunks")
+        return result
+
+    def get_cache_ttl(self, tags):
+        """
+        Returns the result cache TTL in seconds if the script is cacheable, i.e. has the 'cache' tag - otherwise 0.
+        The TTL may be set in the tag like 'cache:60', otherwise the default TTL is used.
+        """
+        for tag in tags:
+            if tag == self.cache_tag:
+                return self.cache_default_ttl
+            if tag.startswith(self.cache_tag + ":"):
+                return float(tag.split(":")[1])
+        return 0
+
+    def format_arguments(self, *args):
+        """
+        Formats the arguments for an eggPlant script call, e.g. ' 123, "string value", ("list", "value"),'.
+        String arguments with spaces inside will be surrounded with quotes (") automatically.
+        eggPlant list syntax is supported - like 'script (1, "val2", "3", val4)'
+        """
+        command = ""
         log.debug("Now add parameters to the command string")
         for arg in args:
             log.debug("Processing argument: {}".format(arg))
@@ -357,10 +961,7 @@ class EggplantLibDynamicCore:
                 arg_f = utils.single_quote_to_double(arg)
             log.debug("Formatted argument: {}".format(arg_f))
             command = "{} {},".format(command, arg_f)
-
-        result = self.execute(command, parse_result=True)
-        return utils.auto_convert(
-            result)  # The result is always a string so we should try to convert it first
+        return command
 
     def execute(self, command, parse_result=False, exception_on_failure=True):
         """
@@ -383,7 +984,13 @@ class EggplantLibDynamicCore:
         """
         log.info("Send command to eggPlant server: '{}'".format(command))
 
-        returned_string = self.eggplant_server.execute(command)
+        with self.trace('eggDrive execute', 'eggdrive', {'command': command[:200]} if self.tracer else None):
+            if self.profiler:
+                started = time.perf_counter()
+                returned_string = self.eggplant_server.execute(command)
+                self.profiler.add_eggdrive_time(time.perf_counter() - started)
+            else:
+                returned_string = self.eggplant_server.execute(command)
         # example: {'Duration': 0.004000067711, 'Output': '28.01.19, 16:32:16\tconnect\t\tWindows_10_1:(null)\n',
         # 'Result': 'E:/screenshot.png', 'ReturnValue': ''}
         log.debug("Returned string: {}".format(returned_string))
@@ -403,6 +1010,12 @@ class EggplantLibDynamicCore:
 
         result_section = returned_string['Result']
         return_value = result_section
+        if self.command_timings:
+            # scripts report their start and duration, other commands the duration of the eggDrive call only
+            script_result = result_section if isinstance(result_section, dict) else {}
+            self.command_timings.add(self.run_state.current_script or "(commands)", output,
+                                     script_result.get('RunDate'),
+                                     script_result.get('Duration', returned_string['Duration']))
         log.debug("Execution result: {}".format(result_section))
 
         if parse_result:
@@ -423,6 +1036,7 @@ class EggplantLibDynamicCore:
 
             eggdrive_command_duration = returned_string['Duration']
             eggplant_script_duration = result_section['Duration']
+            self.run_state.last_script_duration = eggplant_script_duration
             if eggdrive_command_duration and eggplant_script_duration:
                 execution_delay = float(eggdrive_command_duration) - float(eggplant_script_duration)
                 log.debug(f"eggdrive execution delay: {execution_delay:.2f} seconds")
@@ -433,12 +1047,31 @@ class EggplantLibDynamicCore:
 
             return_value = result_section['ReturnValue']
             status = result_section['Status']
-            if status != "Success" and exception_on_failure:
-                raise EggplantExecutionException(result_section['ErrorMessage'])
+            log_file = result_section.get('LogFile')  # not available in the lightweight mode
+            if status != "Success":
+                self.log_eggplant_log_tail(log_file)
+                if exception_on_failure:
+                    raise EggplantExecutionException(result_section['ErrorMessage'])
+            elif log_file:
+                log.info(f"eggPlant log file: {log_file}")
 
         log.info("Return value: {}".format(return_value))
         return return_value
 
+    @traced('diagnostics')
+    def log_eggplant_log_tail(self, log_file):
+        """
+        Logs the end of the eggPlant log file of a failed script - at most 'log_file_tail_bytes'
+        """
+        if not log_file:
+            return
+        try:
+            tail = utils.read_file_tail(log_file, self.log_file_tail_bytes)
+        except OSError as e:
+            log.info(f"eggPlant log file: {log_file} - unable to read it: {e}")
+            return
+        log.info(f"Tail of the eggPlant log file {log_file}:\n{tail}")
+
     def get_static_keyword(self, name):
         """
         Returns the method object if a static keyword with the requested name exists in the library and None otherwise
@@ -490,11 +1123,113 @@ class EggplantLibDynamicCore:
         :param name: script path in RobotFramework format, without '.script' extension. Example: 'subfolder.Script'
         :return: real file path, e.g. '<eggPlantSuite>/Scripts/subfolder/Script.script'
         """
+        suite, name = self.split_suite_name(name)
         name_with_replaced_dots = name.replace(".", "/")
         # the "." is replaced because of scripts in subfolders
-        filepath = os.path.join(self.keywords_dir, name_with_replaced_dots + ".script")
+        filepath = os.path.join(suite, self.scripts_dir, name_with_replaced_dots + ".script")
         return filepath
 
+    def split_suite_name(self, name):
+        """
+        Returns the suite path and the script name without the suite prefix, e.g. 'SuiteOne.Lists.returnNestedList'
+        -> ('<path>/SuiteOne.suite', 'Lists.returnNestedList'). Names are not prefixed if there is a single suite.
+        """
+        if self.multi_suite:
+            suite_name, _, script = name.partition(".")
+            if suite_name in self.eggplant_suites:
+                return self.eggplant_suites[suite_name], script
+        return self.eggplant_suite, name
+
+    def check_no_broker(self, keyword_name):
+        """
+        Fails if the library uses an eggDrive broker - for keywords connecting to eggDrive instances directly,
+        which would take them away from the broker
+        """
+        if self.broker:
+            raise RuntimeError(f"'{keyword_name}' connects to eggDrive instances directly, "
+                               f"which can't be combined with the eggDrive broker ('broker' import parameter)")
+
+    def get_image_arguments(self, name, args):
+        """
+        Returns image names passed to the eggPlant script - values of parameters with 'image' in the name
+        and images referenced in image functions inside of the arguments, e.g. 'imagelocation("OtherCorner")'
+        """
+        images = []
+        parameters = [parameter[0] for parameter in self.get_keyword_arguments(name)]
+        for parameter, arg in zip(parameters + [''] * len(args), args):
+            if not isinstance(arg, str):
+                continue
+            references = find_image_references(arg)
+            if references:
+                images.extend(references)
+            elif "image" in parameter.lower() and arg and not arg.startswith("("):
+                images.append(arg.strip('"'))
+        return images
+
+    def check_image_references(self, suite, images):
+        """
+        Checks that the images or collections exist in the 'Images' folder of the suite - depending on the
+        'image_check' mode an unknown image is logged as a warning or an exception is raised.
+        """
+        if not images:
+            return
+        index = self.image_indexes.get(suite)
+        if index is None:
+            index = self.image_indexes[suite] = ImageIndex(os.path.join(suite, "Images"))
+        for image in images:
+            if index.contains(image):
+                continue
+            message = f"Unknown image '{image}' - not found in {index.images_dir}"
+            suggestions = index.suggest(image)
+            if suggestions:
+                message += f". Did you mean: {', '.join(suggestions)}?"
+            if self.image_check == 'strict':
+                raise Exception(message)
+            log.warn(message)
+
+    def activate_suite(self, suite):
+        """
+        Makes sure the eggDrive session is open with the suite - the session is opened on the first call
+        of a script from the suite and kept open until a script from another suite is called.
+        eggDrive runs a single session at a time, so the session of the previous suite is closed first.
+        """
+        if suite == self.active_suite:
+            return
+        with self.eggplant_server.lock:
+            if self.active_suite:
+                try:
+                    self.eggplant_server.endsession(self.active_suite)
+                    self.active_suite = None
+                except xmlrpc.client.Fault as e:  # the session might still be open - tried again below if busy
+                    log.info(f"Closing the session with the suite {self.active_suite} failed: {e.faultString}")
+            log.info(f"Open the eggPlant session with the test suite: {suite}")
+            try:
+                self.eggplant_server.startsession(suite)
+            except xmlrpc.client.Fault as e:
+                if "BUSY: Session in progress" not in e.faultString:
+                    raise
+                log.info("Old session busy - close it automatically")
+                self.end_open_session(suite)
+                self.eggplant_server.startsession(suite)
+            self.active_suite = suite
+
+    def end_open_session(self, suite):
+        """
+        Ends the session blocking the start of a session with the suite. The suite of the session is known
+        if the library opened it, otherwise the sessions with the requested and the other library suites are tried -
+        e.g. left open by a previous run.
+        """
+        candidates = [self.active_suite, suite] + list(self.eggplant_suites.values())
+        for candidate in dict.fromkeys(candidate for candidate in candidates if candidate):
+            try:
+                self.eggplant_server.endsession(candidate)
+            except xmlrpc.client.Fault as e:
+                log.debug(f"No session with the suite {candidate} to close: {e.faultString}")
+                continue
+            log.info(f"Closed the session with the suite {candidate}")
+            self.active_suite = None
+            return
+
     def get_top_comments(self, script_name):
         """
         Fetches all comments from the script file top.
@@ -509,11 +1244,17 @@ class EggplantLibDynamicCore:
         multiline_comment_start = '(*'
         multiline_comment_end = '*)'
 
+        file_path = self.get_script_file_path(script_name)
+        mtime = os.stat(file_path).st_mtime
+        cached = self.top_comments_cache.get(file_path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
         log.debug("Reading top comments from eggPlant script file: {}".format(script_name))
 
         result = ""
 
-        with open(self.get_script_file_path(script_name), encoding="utf8") as f:
+        with open(file_path, encoding="utf8") as f:
             inside_multiline_comment = False
             for line in f:
 
@@ -559,8 +1300,70 @@ class EggplantLibDynamicCore:
 
                 result = result[:result.rfind("\n")]  # remove the last new line character
                 break  # no comment chars found - means we don't need to go further
+        self.top_comments_cache[file_path] = (mtime, result)
         return result
 
+    def build_keyword_index(self):
+        """
+        Reads the top comments of all eggPlant scripts in advance, so arguments, documentation and tags
+        of the keywords are taken from the cache later.
+        :return: the number of scripts
+        """
+        scripts = [name for name in self.get_keyword_names() if not self.get_static_keyword(name)]
+        for name in scripts:
+            self.get_top_comments(name)
+        return len(scripts)
+
+    def check_suite_assets(self):
+        """
+        Checks that all scripts and images of the eggPlant suite(s) are readable.
+        :return: the number of checked files and a list of paths of unreadable files
+        """
+        checked = 0
+        unreadable = []
+        for suite in self.eggplant_suites.values():
+            for folder in (os.path.join(suite, self.scripts_dir), os.path.join(suite, "Images")):
+                for root, _, files in os.walk(folder):
+                    for file_name in files:
+                        path = os.path.join(root, file_name)
+                        checked += 1
+                        try:
+                            with open(path, "rb") as f:
+                                f.read(1)
+                        except OSError:
+                            unreadable.append(path)
+        return checked, unreadable
+
+    def get_script_tags(self, script_name):
+        """
+        Returns the list of RF tags set in the last line of the script documentation, e.g. 'Tags: first, second'.
+        Tag names are returned in lower case.
+        :param script_name: name of the eggPlant script in RF or eggPlant format. Without '.script' extension.
+        """
+        tags_prefix = "tags:"
+        comments = self.get_top_comments(script_name).strip()
+        last_line = comments.splitlines()[-1].strip() if comments else ""
+        if not last_line.lower().startswith(tags_prefix):
+            return []
+        return [tag.strip().lower() for tag in last_line[len(tags_prefix):].split(",") if tag.strip()]
+
+    def get_return_converter(self, script_name):
+        """
+        Returns the converter of the return type declared in the script documentation, e.g. 'Returns: list[str]'.
+        Scripts without a declaration get their results converted using 'auto_convert'.
+        :param script_name: name of the eggPlant script in RF or eggPlant format. Without '.script' extension.
+        """
+        for line in self.get_top_comments(script_name).splitlines():
+            match = self.return_type_pattern.match(line.strip())
+            if match:
+                try:
+                    return utils.get_return_converter(match.group(1))
+                except ValueError as e:
+                    log.warn(f"{script_name}: {e}. The result is converted automatically.")
+                    break
+        return utils.auto_convert
+
+    @traced('diagnostics')
     def log_ocr_debug_info(self, exception_text):
         """
         Performs OCR (eggPlant 'readText' command) in the restricted search rectangle extracted from the error message.
@@ -595,14 +1398,21 @@ class EggplantLibDynamicCore:
             dir_path = os.path.abspath(os.path.dirname(__file__))
             file_path = os.path.join(dir_path, "EggplantLib.config")
 
-        if os.path.isfile(file_path):
-            with open(file_path, encoding="utf8") as f:
-                for line in f:
-                    if line.startswith(key):
-                        return line.split('=')[1].strip()
+        try:
+            config = parse_config(file_path, os.stat(file_path).st_mtime)
+        except OSError:
+            return ''
+        return config.get(key, '')
 
-        return ''
+    def get_output_dir(self):
+        """
+        Returns the current RF output dir. It doesn't change during the run, so it's resolved only once.
+        """
+        if self.output_dir is None:
+            self.output_dir = BuiltIn().get_variable_value("${OUTPUT DIR}")
+        return self.output_dir
 
+    @traced('screenshot')
     def take_screenshot(self, rectangle='', file_path='', highlight_rectangle='', error_if_no_sut=True):
         """
         Captures a SUT screen image and saves it into the specified file.
@@ -635,12 +1445,15 @@ class EggplantLibDynamicCore:
             raise RuntimeError("Given file_path='%s' must be relative to Robot output dir" % target_path)
 
         # image output file path is relative to robot framework output
-        full_path = os.path.join(BuiltIn().get_variable_value("${OUTPUT DIR}"), target_path)
+        full_path = os.path.join(self.get_output_dir(), target_path)
         if not os.path.exists(os.path.split(full_path)[0]):
             os.makedirs(os.path.split(full_path)[0])
 
         rectangle_string = ""
         rectangle_log_msg = "Full screen"
+        if rectangle and self.image_check != 'off':
+            self.check_image_references(self.active_suite or self.eggplant_suite,
+                                        find_rectangle_image_references(rectangle))
         if rectangle:
             rectangle_log_msg = rectangle
             rectangle_string = "Rectangle: ({})".format(rectangle)
@@ -667,24 +1480,17 @@ class EggplantLibDynamicCore:
 
         return target_path
 
+    @traced('screenshot')
     def draw_rect_on_image(self, image_file, coordinates, color='red'):        
         log.debug("Draw a {} rectangle with coordinates {} for image {}".format(color, coordinates, image_file))
         
-        if not draw_rects_on_screenshots:
+        modules = load_pillow()
+        if not modules:
             log.debug("Drawing rectangles disabled, check if Pillow is installed")
             return
+        Image, ImageDraw = modules
 
-        coord_str = str(coordinates)
-        coord_str = coord_str.replace("(", "")
-        coord_str = coord_str.replace(")", "")
-        coord_str = coord_str.replace("[", "")
-        coord_str = coord_str.replace("]", "")
-        coord_str = coord_str.replace("'", "")
-        coord_str = coord_str.replace(" ", "")
-        coords = []
-        for i in list(coord_str.split(',')):
-            coords.append(int(i))
-        log.debug(coord_str)
+        coords = utils.parse_coordinates(coordinates)
         log.debug(coords)
 
         im = Image.open(image_file)
@@ -692,6 +1498,27 @@ class EggplantLibDynamicCore:
         draw.rectangle(coords, outline=color, width=3)
         im.save(image_file)
 
+    def finish_results_retention(self):
+        """
+        Stops the background retention thread and applies the policy once more - at the suite end
+        """
+        if self.results_retention:
+            self.results_retention.stop_background()
+            self.results_retention.apply()
+            self.log_retention_reports()
+
+    def log_retention_reports(self):
+        """
+        Logs reports of the results retention passes done so far, e.g. in the background thread
+        """
+        if self.results_retention:
+            for report in self.results_retention.pop_reports():
+                if report.removed or report.errors:
+                    log.info(report.to_text())
+                else:
+                    log.debug(report.to_text())
+
+    @traced('log')
     def log_embedded_image(self, image_path):
         """
         Writes a link to the image file into RF log - so that it appears directly in the HTMl with a small preview
@@ -701,6 +1528,47 @@ class EggplantLibDynamicCore:
                                 f'<td></td></tr><tr><td colspan="3"><a href="{image_path}">'
                                 f'<img src="{image_path}" height="350px"></a></td></tr>')
 
+    @traced('video')
+    def log_failure_video(self, preview_image_path=None):
+        """
+        Embeds the current video into RF log in case of errors.
+        In the segmented recording mode the last segments around the failure are kept on disk and embedded.
+        """
+        if self.movie_segments and self.movie_segments.recording:
+            segments = self.movie_segments.pin_window()
+            log.info(f"Movie segments around the failure: {len(segments)}")
+            for segment in segments:
+                self.log_embedded_video(segment.path, preview_image_path if segment == segments[-1] else None)
+        else:
+            self.log_embedded_video(self.current_movie_path, preview_image_path)
+
+    def movie_command(self, full_path, fps, compression_rate, highlighting, extra_time):
+        return (f'StartMovie "{full_path}", framesPerSecond:{fps}, compressionRate:{compression_rate}, '
+                f'imageHighlighting:{highlighting}, extraTime:{extra_time}')
+
+    @traced('video')
+    def start_movie_segment(self):
+        """
+        Starts recording of a new movie segment in the segmented recording mode
+        """
+        segment = self.movie_segments.new_segment()
+        full_path = self.movie_segments.full_path(segment)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        self.execute(self.movie_command(full_path, *self.movie_segment_options))
+        self.current_movie_path = segment.path
+
+    @traced('video')
+    def rotate_movie_segment(self):
+        """
+        Stops the current movie segment, starts a new one and deletes old segments out of the ring
+        """
+        log.debug("Rotate movie segments")
+        self.execute('StopMovie')
+        self.movie_segments.finish_current()
+        self.start_movie_segment()
+        self.movie_segments.evict()
+
+    @traced('video')
     def log_embedded_video(self, video_path, preview_image_path=None):
         """
         Writes a link to the video file into RF log - so that it appears as an embedded video player
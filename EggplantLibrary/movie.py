@@ -0,0 +1,97 @@
+from collections import namedtuple
+import os
+import time
+
+MovieSegment = namedtuple('MovieSegment', ['path', 'started'])
+
+
+class MovieSegments:
+    """
+    Bookkeeping for the segmented movie recording - short movie segments are rotated like a ring buffer.
+
+    Only the last `keep_segments` segments are kept on disk, older ones are deleted on each rotation.
+    Segments around a failure are pinned and never deleted - so the disk usage is bounded by the ring size
+    plus the failure windows, regardless of the run length.
+
+    Paths are relative to the RF output dir, the same as for usual movies.
+    """
+
+    def __init__(self, output_dir, folder, segment_duration, keep_segments):
+        self.output_dir = output_dir
+        self.folder = folder
+        self.segment_duration = float(segment_duration)
+        self.keep_segments = max(int(keep_segments), 1)
+        self.segments = []  # finished and current segments, from the oldest to the newest
+        self.pinned = set()
+        self.pending_deletion = []  # segments which couldn't be deleted yet, e.g. still locked by eggPlant
+        self.recording = False
+        self.counter = 0
+
+    @property
+    def current(self):
+        return self.segments[-1] if self.recording and self.segments else None
+
+    def full_path(self, segment):
+        return os.path.join(self.output_dir, segment.path)
+
+    def new_segment(self):
+        self.counter += 1
+        segment = MovieSegment(os.path.join(self.folder, f"Segment__{self.counter:04d}.mp4"), time.monotonic())
+        self.segments.append(segment)
+        self.recording = True
+        return segment
+
+    def finish_current(self):
+        self.recording = False
+
+    def rotation_due(self):
+        current = self.current
+        return current is not None and time.monotonic() - current.started >= self.segment_duration
+
+    def pin_window(self):
+        """
+        Pins the last segments (including the current one) - they won't be deleted anymore.
+        Returns the list of pinned segments.
+        """
+        window = self.segments[-self.keep_segments:]
+        self.pinned.update(window)
+        return window
+
+    def evict(self):
+        """
+        Deletes finished segments which are out of the ring and not pinned.
+        """
+        keep = set(self.segments[-self.keep_segments:]) | self.pinned
+        self._delete([segment for segment in self.segments if segment not in keep])
+
+    def discard_finished(self):
+        """
+        Deletes all finished segments which aren't pinned - e.g. when a test passed.
+        """
+        current = self.current
+        self._delete([segment for segment in self.segments if segment is not current and segment not in self.pinned])
+
+    def _delete(self, segments):
+        for segment in self.pending_deletion + segments:
+            if segment in self.segments:
+                self.segments.remove(segment)
+            if segment in self.pending_deletion:
+                self.pending_deletion.remove(segment)
+            try:
+                os.remove(self.full_path(segment))
+            except FileNotFoundError:
+                pass
+            except OSError:
+                self.pending_deletion.append(segment)  # try again next time
+
+    def disk_usage(self):
+        """
+        Returns the size of the segments on disk in bytes, including segments which couldn't be deleted yet
+        """
+        size = 0
+        for segment in self.segments + self.pending_deletion:
+            try:
+                size += os.path.getsize(self.full_path(segment))
+            except OSError:
+                pass
+        return size
@@ -0,0 +1,109 @@
+from collections import namedtuple
+import re
+
+OutputRecord = namedtuple('OutputRecord', ['time', 'command', 'details'])
+
+line_pattern = re.compile(r'[^\r\n]+')
+# the date format depends on the locale, so only the time of day is parsed, e.g. '28.01.19, 16:32:16'
+time_pattern = re.compile(r'(\d{1,2}):(\d{2}):(\d{2})(?:[.,](\d+))?\s*([AaPp][Mm])?')
+
+
+def parse_time(timestamp):
+    """
+    Returns the time of day in seconds from an eggPlant output timestamp or None if there is no time inside
+    """
+    match = time_pattern.search(timestamp)
+    if not match:
+        return None
+    hours, minutes, seconds, fraction, am_pm = match.groups()
+    hours = int(hours)
+    if am_pm:
+        hours = hours % 12 + (12 if am_pm.lower() == 'pm' else 0)
+    return hours * 3600 + int(minutes) * 60 + int(seconds) + (float("0." + fraction) if fraction else 0.0)
+
+
+def parse_output(output):
+    """
+    Parses the eggPlant output line by line, without splitting it into a list first.
+    Yields records (time of day in seconds, command, details) - one per tab separated line
+    like '28.01.19, 16:32:16\tconnect\t\tWindows_10_1:(null)'. Continuation lines of multiline messages are skipped.
+    """
+    for match in line_pattern.finditer(output):
+        parts = match.group(0).split('\t', 2)
+        if len(parts) < 2:
+            continue
+        seconds = parse_time(parts[0])
+        if seconds is None:
+            continue
+        yield OutputRecord(seconds, parts[1].strip(), parts[2].strip() if len(parts) > 2 else '')
+
+
+def seconds_between(earlier, later):
+    seconds = later - earlier
+    if seconds < 0:  # after midnight
+        seconds += 24 * 3600
+    return seconds
+
+
+def command_durations(records, start=None, duration=None):
+    """
+    Yields tuples (command, seconds). eggPlant writes an output line when a command completes,
+    so a command lasts from the previous line - or from the script start for the first one - until its own line.
+    :param start: time of day in seconds the script started
+    :param duration: script duration in seconds - if the start is unknown, the first command lasts
+                     the rest of the duration not taken by the other commands
+    """
+    previous_time = start
+    first = None
+    for record in records:
+        if previous_time is None:
+            first = record
+        else:
+            yield record.command, seconds_between(previous_time, record.time)
+        previous_time = record.time
+    if first is not None and duration is not None:
+        yield first.command, max(float(duration) - seconds_between(first.time, previous_time), 0.0)
+
+
+class CommandTimings:
+    """
+    Aggregates time spent per SenseTalk command (e.g. click, waitFor, readText) inside each eggPlant script,
+    parsed from the eggPlant output. The timestamps have a resolution of one second in the output,
+    so the timings are meaningful for slow commands only.
+    """
+
+    def __init__(self):
+        self.timings = {}  # (script, command) -> [count, total seconds, max seconds]
+
+    def add(self, script, output, run_date=None, duration=None):
+        """
+        :param run_date: start of the script, e.g. its 'RunDate' result - the time of day is used only
+        :param duration: script duration in seconds
+        """
+        start = parse_time(str(run_date)) if run_date else None
+        for command, seconds in command_durations(parse_output(output), start, duration):
+            timing = self.timings.setdefault((script, command), [0, 0.0, 0.0])
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2] = max(timing[2], seconds)
+
+    def report(self, top=20):
+        per_command = {}
+        for (_, command), (count, total, longest) in self.timings.items():
+            timing = per_command.setdefault(command, [0, 0.0, 0.0])
+            timing[0] += count
+            timing[1] += total
+            timing[2] = max(timing[2], longest)
+
+        lines = ["Slowest eggPlant commands (calls | total s | max s | command):"]
+        for command, (count, total, longest) in sorted(per_command.items(), key=lambda item: item[1][1],
+                                                       reverse=True)[:top]:
+            lines.append(f"{count:6d} | {total:9.1f} | {longest:7.1f} | {command}")
+        lines.append("\nSlowest eggPlant commands per script (calls | total s | max s | command | script):")
+        for (script, command), (count, total, longest) in sorted(self.timings.items(), key=lambda item: item[1][1],
+                                                                 reverse=True)[:top]:
+            lines.append(f"{count:6d} | {total:9.1f} | {longest:7.1f} | {command} | {script}")
+        return "\n".join(lines)
+
+
+command_timings = CommandTimings()
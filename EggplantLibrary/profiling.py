@@ -0,0 +1,127 @@
+import os
+import re
+import threading
+import time
+
+
+class ProfilingState(threading.local):
+    """
+    The keyword profiled in the current thread - keywords may run in several threads at the same time
+    """
+
+    def __init__(self):
+        self.current = None
+
+
+class KeywordProfiler:
+    """
+    Collects profiling data per keyword call and aggregates it per keyword name:
+    - wall time and time spent waiting for eggDrive responses
+    - cProfile statistics (the 'cpu' mode)
+    - memory allocations using tracemalloc (the 'memory' mode)
+
+    Nested calls (e.g. a static keyword calling 'execute') are counted into the outer keyword.
+    Keywords running in several threads are timed separately, but only one of them is profiled by cProfile at a time.
+    The library creates a profiler only if profiling is enabled, so there is no overhead otherwise -
+    the profiling modules are imported on demand as well, which keeps the library import fast.
+    """
+
+    def __init__(self, cpu=True, memory=False, top=20):
+        self.cpu = cpu
+        self.memory = memory
+        self.top = top
+        self.calls = {}  # keyword -> [count, wall time, eggDrive time]
+        self.stats = {}  # keyword -> pstats.Stats
+        self.allocations = {}  # keyword -> {traceback line: [size diff, count diff]}
+        self.state = ProfilingState()
+        self.lock = threading.Lock()  # for the data aggregated from several threads
+        self.cpu_lock = threading.Lock()  # held by the thread running cProfile
+        if memory:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+
+    def run(self, name, function, *args):
+        """
+        Runs the function and records the profiling data for the keyword `name`
+        """
+        if self.state.current is not None:  # nested call
+            return function(*args)
+
+        import cProfile
+        import pstats
+
+        self.state.current = name
+        with self.lock:
+            record = self.calls.setdefault(name, [0, 0.0, 0.0])
+        profile = cProfile.Profile() if self.cpu and self.cpu_lock.acquire(blocking=False) else None
+        snapshot = self.take_snapshot() if self.memory else None
+        started = time.perf_counter()
+        try:
+            if profile:
+                return profile.runcall(function, *args)
+            return function(*args)
+        finally:
+            if profile:
+                self.cpu_lock.release()
+            with self.lock:
+                record[0] += 1
+                record[1] += time.perf_counter() - started
+                if profile:
+                    if name in self.stats:
+                        self.stats[name].add(profile)
+                    else:
+                        self.stats[name] = pstats.Stats(profile)
+            if snapshot:
+                differences = self.take_snapshot().compare_to(snapshot, 'lineno')
+                with self.lock:
+                    self.add_allocations(name, differences)
+            self.state.current = None
+
+    @staticmethod
+    def take_snapshot():
+        import tracemalloc
+        return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+
+    def add_eggdrive_time(self, duration):
+        """
+        Adds the duration of an eggDrive round trip to the currently profiled keyword
+        """
+        if self.state.current is not None:
+            with self.lock:
+                self.calls[self.state.current][2] += duration
+
+    def add_allocations(self, name, differences):
+        allocations = self.allocations.setdefault(name, {})
+        for difference in differences[:self.top * 5]:
+            if not difference.size_diff:
+                continue
+            line = str(difference.traceback[0])
+            item = allocations.setdefault(line, [0, 0])
+            item[0] += difference.size_diff
+            item[1] += difference.count_diff
+
+    def summary(self):
+        lines = ["Keyword profiling summary (calls | wall time s | eggDrive time s | other time s | keyword):"]
+        for name, (count, wall, eggdrive) in sorted(self.calls.items(), key=lambda item: item[1][1], reverse=True):
+            lines.append(f"{count:6d} | {wall:10.3f} | {eggdrive:10.3f} | {wall - eggdrive:10.3f} | {name}")
+        for name, allocations in self.allocations.items():
+            lines.append(f"\nTop {self.top} memory allocations in '{name}' (size diff | count diff | line):")
+            top = sorted(allocations.items(), key=lambda item: abs(item[1][0]), reverse=True)[:self.top]
+            for line, (size, count) in top:
+                lines.append(f"{size / 1024:10.1f} KiB | {count:8d} | {line}")
+        return "\n".join(lines)
+
+    def dump(self, folder):
+        """
+        Writes a '.pstats' file per keyword and the summary with allocations into the folder.
+        Returns the summary file path.
+        """
+        os.makedirs(folder, exist_ok=True)
+        for name, stats in self.stats.items():
+            file_name = re.sub(r'[^\w\-.]+', '_', name) + ".pstats"
+            stats.dump_stats(os.path.join(folder, file_name))
+        summary_path = os.path.join(folder, "summary.txt")
+        with open(summary_path, "w", encoding="utf8") as f:
+            f.write(self.summary())
+        return summary_path
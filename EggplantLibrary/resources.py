@@ -0,0 +1,269 @@
+from collections import namedtuple
+import csv
+import os
+import sys
+import threading
+import time
+
+from .retention import ResultsRetentionManager
+
+ResourceSample = namedtuple('ResourceSample', ['time', 'cpu_percent', 'rss', 'handles', 'results_size',
+                                               'results_runs', 'keyword'])
+
+# psutil is optional - without it only the Results folder is sampled, see 'load_psutil'
+psutil = None
+
+
+def load_psutil():
+    """
+    Imports psutil when it's needed for the first time. Returns the module or None if it isn't installed.
+    """
+    global psutil
+    if psutil is None:
+        try:
+            import psutil as module
+            psutil = module
+        except ModuleNotFoundError:
+            psutil = False
+    return psutil or None
+
+
+def trend_per_hour(samples, field):
+    """
+    Returns the growth of the sample field per hour - the slope of the least squares line
+    """
+    points = [(sample.time, getattr(sample, field)) for sample in samples if getattr(sample, field) is not None]
+    if len(points) < 2:
+        return 0.0
+    mean_time = sum(point[0] for point in points) / len(points)
+    mean_value = sum(point[1] for point in points) / len(points)
+    variance = sum((point[0] - mean_time) ** 2 for point in points)
+    if not variance:
+        return 0.0
+    covariance = sum((point[0] - mean_time) * (point[1] - mean_value) for point in points)
+    return covariance / variance * 3600
+
+
+class ResourceSampler:
+    """
+    Samples resources of the eggPlant process (CPU, RSS, handles) and of the suite 'Results' folder
+    (size, number of runs) in a background thread - for finding out when eggPlant should be recycled.
+
+    Each sample is linked to the keyword running at the moment. The eggPlant process is found by its name,
+    so eggPlant has to run on the same machine. Process metrics need psutil, the Results folder is sampled anyway.
+    Warnings about a growing memory or handle usage are collected in the thread and logged by the library later,
+    as RF ignores messages logged by other threads.
+    """
+
+    process_name = 'eggplant'
+    min_samples = 10  # before a trend is considered
+    rss_growth_warning = 100 * 1024 * 1024  # bytes per hour
+    handles_growth_warning = 500  # per hour
+    default_interval = 10.0  # seconds
+
+    def __init__(self, results_dir, interval=None):
+        self.results_dir = results_dir
+        self.interval = self.default_interval if interval is None else float(interval)
+        self.samples = []
+        self.reported = 0  # number of samples already included in a suite summary
+        self.warnings = []
+        self.warned = set()
+        self.current_keyword = None
+        self.process = None
+        self.results = ResultsRetentionManager(results_dir, None)
+        self.results_size = 0
+        self._folders = {}  # Results subfolder -> (modification time, subfolders, run folders)
+        self._run_sizes = {}  # run folder -> size
+        self._newest_run = None
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        if not load_psutil():
+            self.warnings.append("psutil not found, only the Results folder is sampled."
+                                 " Install using: 'pip install psutil'.")
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, name="EggplantResourceSampler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        if self._thread:
+            self._stop_event.set()
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _loop(self):
+        while not self._stop_event.is_set():
+            try:
+                self.samples.append(self.take_sample())
+                self.check_trends()
+            except Exception as e:  # never let the thread die silently in the middle of a run
+                self.warnings.append(f"Resource sampling failed: {e}")
+            self._stop_event.wait(self.interval)
+
+    def find_process(self):
+        if self.process is not None and self.process.is_running():
+            return self.process
+        self.process = None
+        for process in psutil.process_iter(['name']):
+            if self.process_name in (process.info['name'] or '').lower():
+                self.process = process
+                process.cpu_percent()  # the first call always returns 0 - starts the measurement
+                break
+        return self.process
+
+    def take_sample(self):
+        cpu_percent = rss = handles = None
+        if load_psutil():
+            process = self.find_process()
+            if process is not None:
+                try:
+                    with process.oneshot():
+                        cpu_percent = process.cpu_percent()
+                        rss = process.memory_info().rss
+                        handles = process.num_handles() if sys.platform == 'win32' else process.num_fds()
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    self.process = None
+
+        runs = self.measure_results()
+        return ResourceSample(time.time(), cpu_percent, rss, handles, self.results_size, runs, self.current_keyword)
+
+    def measure_results(self):
+        """
+        Updates the size of the Results folder and returns the number of runs in it. The total size is tracked
+        incrementally - folders are listed again only if their modification time changed (e.g. by a new run),
+        finished runs are measured once. Only the newest run, which might be still written, is measured again.
+        """
+        runs = []
+        folders = {}
+        self._list_results(self.results_dir, "", runs, folders)
+        self._folders = folders
+
+        for path in self._run_sizes.keys() - set(runs):  # removed, e.g. by the retention policy
+            self.results_size -= self._run_sizes.pop(path)
+            self.results.forget_size(path)
+        newest = max(runs, key=os.path.basename, default=None)
+        for path in runs:
+            if path in self._run_sizes and path != newest and path != self._newest_run:
+                continue
+            self.results.forget_size(path)
+            size = self.results.folder_size(path)
+            self.results_size += size - self._run_sizes.get(path, 0)
+            self._run_sizes[path] = size
+        self._newest_run = newest  # measured once more in the next sample, as it could grow until then
+        return len(runs)
+
+    def _list_results(self, folder, script, runs, folders):
+        try:
+            modified = os.stat(folder).st_mtime_ns
+        except OSError:
+            return
+        cached = self._folders.get(folder)
+        if cached and cached[0] == modified:
+            subfolders, folder_runs = cached[1], cached[2]
+        else:
+            subfolders, folder_runs = [], []
+            try:
+                with os.scandir(folder) as it:
+                    for entry in it:
+                        if not entry.is_dir(follow_symlinks=False):
+                            continue
+                        if script and self.results.run_folder_pattern.match(entry.name):
+                            folder_runs.append(entry.path)
+                        else:
+                            subfolders.append(entry.path)
+            except OSError:
+                return
+        folders[folder] = (modified, subfolders, folder_runs)
+        runs.extend(folder_runs)
+        for subfolder in subfolders:
+            self._list_results(subfolder, f"{script}/{os.path.basename(subfolder)}", runs, folders)
+
+    def check_trends(self):
+        if len(self.samples) < self.min_samples:
+            return
+        for field, label, limit, unit, scale in (
+                ('rss', 'memory usage (RSS)', self.rss_growth_warning, 'MB', 1024 * 1024),
+                ('handles', 'number of handles', self.handles_growth_warning, 'handles', 1)):
+            growth = trend_per_hour(self.samples, field)
+            if growth > limit and field not in self.warned:
+                self.warned.add(field)
+                self.warnings.append(f"eggPlant {label} grows by {growth / scale:.0f} {unit} per hour - "
+                                     f"a leak is likely, consider restarting eggPlant")
+
+    def pop_warnings(self):
+        warnings, self.warnings = self.warnings, []
+        return warnings
+
+    def pop_unreported(self):
+        """
+        Returns the samples since the last call - so each sample is included in the summary of a single suite
+        """
+        samples = self.samples[self.reported:]
+        self.reported += len(samples)
+        return samples
+
+    def summary(self, samples=None):
+        """
+        :param samples: the samples to summarize, default is all samples in the run
+        """
+        samples = list(self.samples if samples is None else samples)
+        if not samples:
+            return "No resource samples"
+        lines = [f"Resource samples: {len(samples)} in {(samples[-1].time - samples[0].time) / 60:.1f} min"]
+        cpu = [sample.cpu_percent for sample in samples if sample.cpu_percent is not None]
+        if cpu:
+            lines.append(f"eggPlant CPU: avg {sum(cpu) / len(cpu):.0f} %, max {max(cpu):.0f} %")
+        rss = [sample.rss for sample in samples if sample.rss is not None]
+        if rss:
+            lines.append(f"eggPlant RSS: first {rss[0] / 1024 / 1024:.0f} MB, last {rss[-1] / 1024 / 1024:.0f} MB, "
+                         f"max {max(rss) / 1024 / 1024:.0f} MB, "
+                         f"trend {trend_per_hour(samples, 'rss') / 1024 / 1024:+.0f} MB per hour")
+        handles = [sample.handles for sample in samples if sample.handles is not None]
+        if handles:
+            lines.append(f"eggPlant handles: first {handles[0]}, last {handles[-1]}, max {max(handles)}, "
+                         f"trend {trend_per_hour(samples, 'handles'):+.0f} per hour")
+        lines.append(f"Results folder: {samples[0].results_size / 1024 / 1024:.0f} MB -> "
+                     f"{samples[-1].results_size / 1024 / 1024:.0f} MB, "
+                     f"{samples[0].results_runs} -> {samples[-1].results_runs} runs")
+
+        growth = {}  # keyword -> RSS growth during the keyword
+        for previous, sample in zip(samples, samples[1:]):
+            if sample.keyword and previous.rss is not None and sample.rss is not None:
+                growth[sample.keyword] = growth.get(sample.keyword, 0) + sample.rss - previous.rss
+        if growth:
+            lines.append("Keywords with the largest eggPlant RSS growth (MB | keyword):")
+            for keyword, delta in sorted(growth.items(), key=lambda item: item[1], reverse=True)[:10]:
+                lines.append(f"{delta / 1024 / 1024:8.1f} | {keyword}")
+        return "\n".join(lines)
+
+samplers = {}  # Results folder -> sampler
+
+
+def get_sampler(results_dir, interval=None):
+    """
+    Returns the sampler of the Results folder - library instances of the same suite share it.
+    A shorter interval given by another instance is applied to the shared sampler.
+    :param interval: in seconds, None for the default
+    """
+    key = os.path.normcase(os.path.abspath(results_dir))
+    sampler = samplers.get(key)
+    if sampler is None:
+        sampler = samplers[key] = ResourceSampler(results_dir, interval)
+    elif interval is not None:
+        sampler.interval = min(sampler.interval, float(interval))
+    return sampler
+
+
+def save_samples(file_path):
+    """
+    Writes the samples of all Results folders into a CSV file
+    """
+    with open(file_path, "w", encoding="utf8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(('results_dir',) + ResourceSample._fields)
+        for sampler in list(samplers.values()):
+            writer.writerows((sampler.results_dir,) + tuple(sample) for sample in list(sampler.samples))
+    return file_path
@@ -0,0 +1,105 @@
+import base64
+import xmlrpc.client
+from xml.parsers import expat
+
+# converters of XML RPC scalar types, dateTime values are not converted - eggDrive sends only the unused 'RunDate'
+scalar_converters = {
+    'string': str,
+    'int': int,
+    'i4': int,
+    'i8': int,
+    'double': float,
+    'boolean': lambda text: text.strip() == '1',
+    'dateTime.iso8601': str,
+    'base64': lambda text: base64.decodebytes(text.encode('ascii')),
+    'nil': lambda text: None,
+}
+
+
+class ResponseUnmarshaller:
+    """
+    Builds Python values from an XML RPC response, like 'xmlrpc.client.Unmarshaller', but with less Python code
+    per XML event. The character data is collected by the C 'list.append' directly, without a Python callback,
+    which matters for multi MB eggPlant outputs delivered in many small pieces by expat.
+
+    dateTime values are returned as ISO 8601 strings instead of 'xmlrpc.client.DateTime' objects,
+    base64 values as bytes.
+    """
+
+    def __init__(self):
+        self.text = []  # character data since the last start of a value
+        self.stack = []  # open structs and arrays - [container, member name]
+        self.params = []
+        self.value = None
+        self.typed = False  # the current value has a type element - otherwise it's a string
+        self.fault = False
+
+    def start(self, tag, attrs):
+        if tag == 'value':
+            self.typed = False
+            self.text.clear()
+        elif tag == 'struct':
+            self.stack.append([{}, None])
+        elif tag == 'array':
+            self.stack.append([[], None])
+        elif tag == 'fault':
+            self.fault = True
+        else:
+            self.text.clear()
+
+    def end(self, tag):
+        converter = scalar_converters.get(tag)
+        if converter:
+            self.value = converter("".join(self.text))
+            self.typed = True
+        elif tag == 'value':
+            if not self.typed:
+                self.value = "".join(self.text)
+            if not self.stack:
+                self.params.append(self.value)
+            elif self.stack[-1][1] is None:
+                self.stack[-1][0].append(self.value)
+            else:
+                self.stack[-1][0][self.stack[-1][1]] = self.value
+        elif tag == 'name':
+            self.stack[-1][1] = "".join(self.text)
+        elif tag in ('struct', 'array'):
+            self.value = self.stack.pop()[0]
+            self.typed = True
+
+    def close(self):
+        if self.fault:
+            raise xmlrpc.client.Fault(**self.params[0])
+        return tuple(self.params)
+
+
+class ResponseParser:
+    """
+    expat parser feeding the unmarshaller - the character data is buffered by expat up to 'buffer_size',
+    so long strings don't come in pieces per line
+    """
+
+    buffer_size = 1024 * 1024
+
+    def __init__(self, target):
+        self.parser = parser = expat.ParserCreate(None, None)
+        parser.buffer_text = True
+        parser.buffer_size = self.buffer_size
+        parser.StartElementHandler = target.start
+        parser.EndElementHandler = target.end
+        parser.CharacterDataHandler = target.text.append
+
+    def feed(self, data):
+        self.parser.Parse(data, False)
+
+    def close(self):
+        self.parser.Parse(b"", True)
+        del self.parser  # the handlers refer to the target
+
+
+def getparser():
+    """
+    Returns a parser and an unmarshaller for eggDrive XML RPC responses - a replacement for 'xmlrpc.client.getparser'
+    """
+    target = ResponseUnmarshaller()
+    return ResponseParser(target), target
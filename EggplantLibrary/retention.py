@@ -0,0 +1,243 @@
+from datetime import datetime
+import os
+import re
+import shutil
+import threading
+import time
+
+
+class ResultsRetentionPolicy:
+    """
+    Limits applied to the eggPlant 'Results' folder of a suite.
+    Each limit is optional - an empty value (None or 0) disables it.
+
+    - max_age_days - run folders older than this are removed
+    - max_count_per_script - only the newest N run folders of each script are kept
+    - max_total_size_mb - oldest run folders are removed until the total size fits the limit
+    """
+
+    def __init__(self, max_age_days=None, max_count_per_script=None, max_total_size_mb=None, dry_run=False):
+        self.max_age_days = float(max_age_days) if max_age_days else None
+        self.max_count_per_script = int(max_count_per_script) if max_count_per_script else None
+        self.max_total_size_mb = float(max_total_size_mb) if max_total_size_mb else None
+        self.dry_run = dry_run
+
+    def is_empty(self):
+        return not (self.max_age_days or self.max_count_per_script or self.max_total_size_mb)
+
+    def __str__(self):
+        return (f"max age: {self.max_age_days} days, max count per script: {self.max_count_per_script}, "
+                f"max total size: {self.max_total_size_mb} MB, dry run: {self.dry_run}")
+
+
+class ResultsRetentionReport:
+    """
+    Outcome of a single retention pass - the run folders which were removed (or would be removed in the dry run mode).
+    """
+
+    def __init__(self, results_dir, dry_run):
+        self.results_dir = results_dir
+        self.dry_run = dry_run
+        self.scanned_runs = 0
+        self.removed = []  # tuples (path, script, reason, size in bytes or None)
+        self.errors = []  # tuples (path, error message)
+        self.duration = 0.0
+
+    @property
+    def removed_paths(self):
+        return [item[0] for item in self.removed]
+
+    def to_text(self, max_lines=50):
+        action = "Would remove" if self.dry_run else "Removed"
+        freed = sum(item[3] or 0 for item in self.removed)
+        lines = [f"Results retention in '{self.results_dir}': scanned {self.scanned_runs} run folders, "
+                 f"{action.lower()} {len(self.removed)} ({freed / 1024 / 1024:.1f} MB known size) "
+                 f"in {self.duration:.2f} s"]
+        for path, script, reason, _ in self.removed[:max_lines]:
+            lines.append(f"{action}: {script} | {os.path.basename(path)} | {reason}")
+        if len(self.removed) > max_lines:
+            lines.append(f"... and {len(self.removed) - max_lines} more")
+        for path, error in self.errors:
+            lines.append(f"Failed removing {path}: {error}")
+        return "\n".join(lines)
+
+
+class ResultsRetentionManager:
+    """
+    Applies a retention policy to the eggPlant 'Results' folder, which grows with each 'RunWithNewResults' call.
+
+    The expected layout is '<Results>/<script name>/<run timestamp>/LogFile.txt'.
+    The scan uses 'os.scandir' only and relies on the eggPlant run folder names (e.g. '20190125_144557.016')
+    for the age and the ordering, so no extra 'stat' calls are needed unless the size limit is set.
+    Sizes of run folders are cached between passes as finished runs don't change anymore.
+
+    The newest run folder of each script is never removed - it might belong to a script being executed right now.
+    """
+
+    run_folder_pattern = re.compile(r'^(\d{8}_\d{6})')
+    run_folder_time_format = '%Y%m%d_%H%M%S'
+
+    def __init__(self, results_dir, policy, throttle=0.01):
+        self.results_dir = results_dir
+        self.policy = policy
+        self.throttle = throttle  # pause after each removal, keeps the disk available for eggPlant
+        self.reports = []
+        self._size_cache = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    # ---------- scanning ------------
+    def scan(self):
+        """
+        Returns a dict 'script name -> list of (run folder name, path, timestamp)', sorted from the oldest to the newest.
+        Scripts in subfolders are grouped by their relative path, e.g. 'Lists/returnList'.
+        """
+        runs = {}
+        if os.path.isdir(self.results_dir):
+            self._scan_folder(self.results_dir, "", runs)
+        for script_runs in runs.values():
+            script_runs.sort()
+        return runs
+
+    def _scan_folder(self, folder, script, runs):
+        try:
+            entries = list(os.scandir(folder))
+        except OSError:
+            return
+        for entry in entries:
+            if not entry.is_dir(follow_symlinks=False):
+                continue
+            match = self.run_folder_pattern.match(entry.name)
+            if match and script:
+                runs.setdefault(script, []).append((entry.name, entry.path, self._run_timestamp(entry, match)))
+            else:
+                sub_script = f"{script}/{entry.name}" if script else entry.name
+                self._scan_folder(entry.path, sub_script, runs)
+
+    def _run_timestamp(self, entry, match):
+        try:
+            return datetime.strptime(match.group(1), self.run_folder_time_format).timestamp()
+        except ValueError:
+            return entry.stat(follow_symlinks=False).st_mtime
+
+    def folder_size(self, path):
+        size = self._size_cache.get(path)
+        if size is None:
+            size = 0
+            stack = [path]
+            while stack:
+                try:
+                    with os.scandir(stack.pop()) as it:
+                        for entry in it:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                            else:
+                                size += entry.stat(follow_symlinks=False).st_size
+                except OSError:
+                    continue
+            self._size_cache[path] = size
+        return size
+
+    def forget_size(self, path):
+        """
+        Removes the cached size of the folder, e.g. of a run which might be still growing
+        """
+        self._size_cache.pop(path, None)
+
+    # ---------- applying the policy ------------
+    def select(self, runs, now=None):
+        """
+        Returns a list of (path, script, reason) for all run folders violating the policy.
+        """
+        now = now or time.time()
+        selected = {}
+        kept = []  # candidates for the size limit, (timestamp, path, script)
+        for script, script_runs in runs.items():
+            newest_path = script_runs[-1][1]
+            count = len(script_runs)
+            for index, (_, path, timestamp) in enumerate(script_runs):
+                if path == newest_path:
+                    continue
+                if self.policy.max_count_per_script and count - index > self.policy.max_count_per_script:
+                    selected[path] = (path, script, f"more than {self.policy.max_count_per_script} runs")
+                elif self.policy.max_age_days and now - timestamp > self.policy.max_age_days * 86400:
+                    selected[path] = (path, script, f"older than {self.policy.max_age_days} days")
+                else:
+                    kept.append((timestamp, path, script))
+
+        if self.policy.max_total_size_mb:
+            limit = self.policy.max_total_size_mb * 1024 * 1024
+            newest = {script_runs[-1][1] for script_runs in runs.values()}
+            total = sum(self.folder_size(path) for _, path, _ in kept) + sum(self.folder_size(p) for p in newest)
+            for timestamp, path, script in sorted(kept):
+                if total <= limit:
+                    break
+                total -= self.folder_size(path)
+                selected[path] = (path, script, f"total size above {self.policy.max_total_size_mb} MB")
+        return list(selected.values())
+
+    def apply(self, dry_run=None):
+        """
+        Performs a single retention pass and returns its report.
+        """
+        dry_run = self.policy.dry_run if dry_run is None else dry_run
+        with self._lock:
+            started = time.perf_counter()
+            report = ResultsRetentionReport(self.results_dir, dry_run)
+            runs = self.scan()
+            report.scanned_runs = sum(len(script_runs) for script_runs in runs.values())
+            for path, script, reason in self.select(runs):
+                if self._stop_event.is_set() and self._thread is threading.current_thread():
+                    break
+                size = self._size_cache.get(path)
+                if not dry_run:
+                    try:
+                        shutil.rmtree(path)
+                        self._size_cache.pop(path, None)
+                    except OSError as e:
+                        report.errors.append((path, str(e)))
+                        continue
+                    if self.throttle:
+                        time.sleep(self.throttle)
+                report.removed.append((path, script, reason, size))
+            report.duration = time.perf_counter() - started
+            self.reports.append(report)
+            return report
+
+    # ---------- background mode ------------
+    def start_background(self, interval):
+        """
+        Starts a daemon thread applying the policy every `interval` seconds.
+        Removals are throttled, so the thread doesn't compete with eggPlant for the disk.
+        """
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._background_loop, args=(float(interval),),
+                                        name="EggplantResultsRetention", daemon=True)
+        self._thread.start()
+
+    def stop_background(self, timeout=None):
+        if self._thread:
+            self._stop_event.set()
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _background_loop(self, interval):
+        while not self._stop_event.is_set():
+            try:
+                self.apply()
+            except Exception as e:  # never let the thread die silently in the middle of a run
+                report = ResultsRetentionReport(self.results_dir, self.policy.dry_run)
+                report.errors.append((self.results_dir, str(e)))
+                self.reports.append(report)
+            self._stop_event.wait(interval)
+
+    def pop_reports(self):
+        """
+        Returns the reports collected so far (e.g. by the background thread) and forgets them.
+        """
+        with self._lock:
+            reports, self.reports = self.reports, []
+        return reports
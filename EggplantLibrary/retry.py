@@ -0,0 +1,88 @@
+from collections import Counter
+import random
+import re
+import xmlrpc.client
+
+
+class RetryPolicy:
+    """
+    Decides which eggDrive faults are transient and how long to wait before the next attempt.
+
+    Faults are classified by regular expressions matched against the fault string - fatal patterns win over
+    transient ones, faults matching neither are fatal. Connection errors (e.g. a restarting eggDrive) are transient.
+    The delay grows exponentially with the attempt and is randomized ('full jitter'), so several processes
+    hitting the same eggDrive don't retry in lockstep.
+    """
+
+    default_transient_patterns = (r'BUSY', r'(?i)timed? ?out', r'(?i)temporarily unavailable',
+                                  r'(?i)connection (reset|refused|closed|lost)')
+    default_fatal_patterns = (r'(?i)no session is active', r'(?i)syntax error', r'(?i)unknown (command|handler)')
+
+    def __init__(self, max_attempts=3, base_delay=1.0, max_delay=30.0, transient_patterns=None,
+                 fatal_patterns=None):
+        self.max_attempts = max(int(max_attempts), 1)
+        self.base_delay = float(base_delay)
+        self.max_delay = float(max_delay)
+        self.transient_patterns = [re.compile(pattern) for pattern in
+                                   (transient_patterns or self.default_transient_patterns)]
+        self.fatal_patterns = [re.compile(pattern) for pattern in (fatal_patterns or self.default_fatal_patterns)]
+
+    def is_transient(self, error):
+        if not isinstance(error, xmlrpc.client.Fault):
+            return isinstance(error, ConnectionError)
+        if any(pattern.search(error.faultString) for pattern in self.fatal_patterns):
+            return False
+        return any(pattern.search(error.faultString) for pattern in self.transient_patterns)
+
+    def delay(self, attempt):
+        """
+        Returns the random delay in seconds before the attempt following the failed `attempt` (1 based)
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class RetryLog:
+    """
+    Records retries of all library instances in the process - for the summary of the whole run
+    """
+
+    def __init__(self):
+        self.retries = []  # (test, keyword, fault, delay)
+        self.reported = 0  # number of retries already included in a suite summary
+
+    def record(self, test, keyword, fault, delay):
+        self.retries.append((test, keyword, fault, delay))
+
+    def pop_unreported(self):
+        """
+        Returns the retries since the last call - so each retry is included in the summary of a single suite
+        """
+        retries = self.retries[self.reported:]
+        self.reported += len(retries)
+        return retries
+
+    def summary(self, retries=None):
+        """
+        :param retries: the retries to summarize, default is all retries in the run
+        """
+        retries = self.retries if retries is None else retries
+        lines = [f"eggDrive retries: {len(retries)}, waited {sum(item[3] for item in retries):.1f} s"]
+        lines.append("Retries per keyword:")
+        for keyword, count in Counter(item[1] for item in retries).most_common():
+            lines.append(f"{count:6d} | {keyword}")
+        lines.append("Retries per fault:")
+        for fault, count in Counter(item[2][:100] for item in retries).most_common():
+            lines.append(f"{count:6d} | {fault}")
+        lines.append("Retries per test:")
+        for test, count in Counter(item[0] for item in retries).most_common():
+            lines.append(f"{count:6d} | {test}")
+        return "\n".join(lines)
+
+
+retry_log = RetryLog()
+
+
+def describe_fault(error):
+    if isinstance(error, xmlrpc.client.Fault):
+        return f"Fault {error.faultCode}: {error.faultString}"
+    return f"{type(error).__name__}: {error}"
@@ -0,0 +1,71 @@
+import json
+import math
+import os
+
+from .dependencies import FileLock
+
+
+class DurationStore:
+    """
+    Persistent store of observed eggPlant script durations, used for adaptive per-script timeouts.
+
+    The deadline of a script is its p99 duration multiplied by the factor, limited by the floor and the ceiling.
+    Scripts with too few observed durations get the ceiling as deadline.
+
+    The store is a small JSON file '{script: [durations, ...]}', keeping the last 'max_samples' durations per script.
+    New durations are merged into the file on saving under a lock file - so several processes (e.g. pabot)
+    may share it.
+    """
+
+    max_samples = 100
+    min_samples = 5
+    lock_timeout = 30.0
+
+    def __init__(self, file_path, factor=3.0, floor=30.0, ceiling=1800.0):
+        self.file_path = file_path
+        self.factor = float(factor)
+        self.floor = float(floor)
+        self.ceiling = float(ceiling)
+        self.durations = self.load()
+        self.new_durations = {}
+
+    def load(self):
+        try:
+            with open(self.file_path, encoding="utf8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def add(self, script, duration):
+        for durations in (self.durations.setdefault(script, []), self.new_durations.setdefault(script, [])):
+            durations.append(round(float(duration), 3))
+            del durations[:-self.max_samples]
+
+    def percentile(self, script, percent=99):
+        durations = sorted(self.durations.get(script, []))
+        if len(durations) < self.min_samples:
+            return None
+        return durations[max(math.ceil(percent / 100 * len(durations)) - 1, 0)]
+
+    def deadline(self, script):
+        p99 = self.percentile(script)
+        if p99 is None:
+            return self.ceiling
+        return min(max(p99 * self.factor, self.floor), self.ceiling)
+
+    def save(self):
+        if not self.new_durations:
+            return
+        folder = os.path.dirname(os.path.abspath(self.file_path))
+        os.makedirs(folder, exist_ok=True)
+        with FileLock(f"{self.file_path}.lock", self.lock_timeout):
+            durations = self.load()
+            for script, new in self.new_durations.items():
+                merged = durations.setdefault(script, []) + new
+                durations[script] = merged[-self.max_samples:]
+            temp_path = f"{self.file_path}.{os.getpid()}.tmp"
+            with open(temp_path, "w", encoding="utf8") as f:
+                json.dump(durations, f, indent=1, sort_keys=True)
+            os.replace(temp_path, self.file_path)
+        self.durations = durations
+        self.new_durations = {}
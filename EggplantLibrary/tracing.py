@@ -0,0 +1,156 @@
+"""
+Tracing of the library activity in the Chrome trace event format - to be opened in Perfetto or chrome://tracing.
+
+Each process writes a single trace file. Files of several processes (e.g. pabot) can be merged:
+    python -m EggplantLibrary.tracing merged_trace.json Traces/eggplant_trace_*.json
+"""
+from contextlib import nullcontext
+import glob
+import json
+import os
+import sys
+import threading
+import time
+
+# returned instead of a span if tracing is disabled - no overhead apart from the 'with' statement
+no_span = nullcontext()
+
+# the trace file ends with it - new events are written over it
+TRACE_FILE_END = '\n], "displayTimeUnit": "ms"}'
+
+
+class Span:
+    """
+    Context manager recording a complete event ('X') with the duration of the 'with' block
+    """
+    __slots__ = ('tracer', 'name', 'category', 'args', 'started')
+
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        finished = time.perf_counter()
+        event = {'name': self.name, 'cat': self.category, 'ph': 'X', 'ts': self.tracer.timestamp(self.started),
+                 'dur': (finished - self.started) * 1e6, 'pid': self.tracer.pid, 'tid': threading.get_ident()}
+        if self.args or exc_type:
+            event['args'] = dict(self.args or {})
+            if exc_type:
+                event['args']['error'] = f"{exc_type.__name__}: {exc_value}"
+        self.tracer.events.append(event)
+        return False
+
+
+class OpenSpans(threading.local):
+    """
+    Spans recorded via 'begin' and 'end' in the current thread - (name, start time), the innermost last
+    """
+
+    def __init__(self):
+        self.spans = []
+
+
+class Tracer:
+    """
+    Records nested spans of the library activity. Timestamps are absolute (microseconds since epoch),
+    so traces of several processes can be merged into a single timeline.
+    """
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.events = []
+        self.clock_offset = time.time() - time.perf_counter()
+        self.open_spans = OpenSpans()
+        self.path = None  # trace file written so far
+
+    def timestamp(self, perf_counter_value):
+        return (self.clock_offset + perf_counter_value) * 1e6
+
+    def span(self, name, category='library', args=None):
+        return Span(self, name, category, args)
+
+    def begin(self, name):
+        """
+        Starts a span which is finished with 'end' - for listener events like 'start_keyword' and 'end_keyword',
+        which are always nested properly in their thread
+        """
+        self.open_spans.spans.append((name, time.perf_counter()))
+
+    def end(self, category, args=None):
+        if not self.open_spans.spans:
+            return
+        name, started = self.open_spans.spans.pop()
+        event = {'name': name, 'cat': category, 'ph': 'X', 'ts': self.timestamp(started),
+                 'dur': (time.perf_counter() - started) * 1e6, 'pid': self.pid, 'tid': threading.get_ident()}
+        if args:
+            event['args'] = args
+        self.events.append(event)
+
+    def save(self, folder):
+        """
+        Appends the events recorded since the last save to the trace file of this process and returns the file path.
+        The file stays a valid JSON document after each save - only the new events are written.
+        """
+        path = os.path.join(folder, f"eggplant_trace_{self.pid}.json")
+        count = len(self.events)
+        events = self.events[:count]
+        del self.events[:count]  # events appended by other threads in the meantime are kept for the next save
+        if path != self.path or not os.path.exists(path):
+            os.makedirs(folder, exist_ok=True)
+            metadata = {'name': 'process_name', 'ph': 'M', 'pid': self.pid, 'args': {'name': f"robot {self.pid}"}}
+            with open(path, "w", encoding="utf8") as f:
+                f.write('{"traceEvents": [' + json.dumps(metadata) + TRACE_FILE_END)
+            self.path = path
+        if events:
+            with open(path, "r+b") as f:
+                f.seek(-len(TRACE_FILE_END), os.SEEK_END)
+                f.write("".join(",\n" + json.dumps(event) for event in events).encode("utf8"))
+                f.write(TRACE_FILE_END.encode("utf8"))
+        return path
+
+
+tracer = None
+
+
+def get_tracer():
+    """
+    Returns the tracer of this process - all library instances (e.g. imported in several suites) share it
+    """
+    global tracer
+    if tracer is None:
+        tracer = Tracer()
+    return tracer
+
+
+def merge(output_path, input_paths):
+    """
+    Merges trace files of several processes into a single file
+    """
+    events = []
+    for path in input_paths:
+        with open(path, encoding="utf8") as f:
+            events.extend(json.load(f)['traceEvents'])
+    with open(output_path, "w", encoding="utf8") as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+    return len(events)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) < 2:
+        print(__doc__)
+        return 1
+    input_paths = [path for pattern in argv[1:] for path in sorted(glob.glob(pattern))]
+    count = merge(argv[0], input_paths)
+    print(f"Merged {count} events of {len(input_paths)} files into {argv[0]}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
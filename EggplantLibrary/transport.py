@@ -0,0 +1,162 @@
+import http.client
+import socket
+import threading
+import urllib.parse
+import xmlrpc.client
+
+from . import response
+
+
+class TimeoutTransport(xmlrpc.client.Transport):
+    """
+    XML RPC transport with a socket timeout, which can be changed before each request.
+    The timeout None means waiting forever - the default behavior of the standard transport.
+    Responses are read in larger blocks and parsed by the faster parser from 'response'.
+    """
+
+    read_block_size = 64 * 1024  # the standard transport reads 1 KB blocks
+
+    def __init__(self, timeout=None, **kwargs):
+        super().__init__(**kwargs)
+        self.timeout = timeout
+
+    def make_connection(self, host):
+        connection = super().make_connection(host)
+        connection.timeout = self.timeout
+        if connection.sock is not None:  # reused connection
+            connection.sock.settimeout(self.timeout)
+        return connection
+
+    def getparser(self):
+        return response.getparser()
+
+    def parse_response(self, http_response):
+        if http_response.getheader("Content-Encoding", "") == "gzip":
+            stream = xmlrpc.client.GzipDecodedResponse(http_response)
+        else:
+            stream = http_response
+        parser, unmarshaller = self.getparser()
+        while True:
+            data = stream.read(self.read_block_size)
+            if not data:
+                break
+            parser.feed(data)
+        if stream is not http_response:
+            stream.close()
+        parser.close()
+        return unmarshaller.close()
+
+
+class SafeTimeoutTransport(TimeoutTransport, xmlrpc.client.SafeTransport):
+    """
+    HTTPS variant of 'TimeoutTransport'
+    """
+
+
+def create_transport(uri, timeout=None):
+    """
+    Returns a transport with a timeout matching the URI scheme - like ServerProxy chooses the standard transports
+    """
+    if uri.lower().startswith("https:"):
+        return SafeTimeoutTransport(timeout)
+    return TimeoutTransport(timeout)
+
+
+class UnixSocketConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class UnixSocketTransport(TimeoutTransport):
+    """
+    XML RPC transport over a Unix socket - used for connecting to the eggDrive broker, see 'broker'
+    """
+
+    def __init__(self, socket_path, timeout=None, **kwargs):
+        super().__init__(timeout, **kwargs)
+        self.socket_path = socket_path
+
+    def make_connection(self, host):
+        if not (self._connection and self._connection[0] == host):
+            self._connection = host, UnixSocketConnection(self.socket_path)
+        connection = self._connection[1]
+        connection.timeout = self.timeout
+        if connection.sock is not None:  # reused connection
+            connection.sock.settimeout(self.timeout)
+        return connection
+
+
+# eggDrive URI -> lock serializing the commands, shared by all connections to the same eggDrive instance
+command_locks = {}
+command_locks_guard = threading.Lock()
+
+
+def get_command_lock(uri):
+    with command_locks_guard:
+        return command_locks.setdefault(uri, threading.RLock())
+
+
+def client_uri(client_id, priority=0):
+    """
+    Returns the URI the library uses for the broker - the path identifies the Robot process and its priority
+    """
+    return f"http://eggplant-broker/{urllib.parse.quote(str(client_id), safe='')}/{int(priority)}"
+
+
+class ThreadLocalServerProxy:
+    """
+    XML RPC connection to eggDrive which may be used from several threads, e.g. by listeners taking screenshots.
+
+    Each thread gets an own ServerProxy with an own transport, as HTTP connections are not thread-safe.
+    The commands are serialized using a lock per eggDrive instance, as eggDrive runs a single command at a time.
+    Hold the 'lock' for sequences of commands which must not be interleaved with commands of other threads.
+    """
+
+    def __init__(self, uri, timeout=None, socket_path=None):
+        self.uri = uri
+        self.timeout = timeout
+        self.socket_path = socket_path
+        self.lock = get_command_lock(uri)
+        self.local = threading.local()
+
+    def proxy(self):
+        proxy = getattr(self.local, 'proxy', None)
+        if proxy is None:
+            if self.socket_path:
+                transport = UnixSocketTransport(self.socket_path, self.timeout)
+            else:
+                transport = create_transport(self.uri, self.timeout)
+            proxy = self.local.proxy = xmlrpc.client.ServerProxy(self.uri, transport=transport)
+        return proxy
+
+    def __call__(self, attr):
+        """
+        The standard ServerProxy way of accessing the transport - 'server("transport")' returns the transport
+        of the calling thread, so a timeout set there applies to the commands of this thread only
+        """
+        return self.proxy()(attr)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        method = getattr(self.proxy(), name)
+
+        def call(*args):
+            with self.lock:
+                return method(*args)
+        return call
+
+
+def create_server_proxy(uri, timeout=None, socket_path=None):
+    """
+    Creates a thread-safe XML RPC connection to eggDrive, which supports timeouts - see 'ThreadLocalServerProxy'.
+    The transport is available via the call 'server("transport")' - the standard ServerProxy way.
+    If the socket path is given, the connection goes to the eggDrive broker over its Unix socket instead.
+    """
+    return ThreadLocalServerProxy(uri, timeout, socket_path)
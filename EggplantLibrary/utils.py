@@ -1,5 +1,8 @@
 import logging as log
 import ast
+import functools
+import os
+import re
 import warnings
 
 
@@ -252,6 +255,43 @@ def auto_convert(s):
     return val
 
 
+def parse_coordinates(coordinates):
+    """
+    Converts coordinates in one of formats - '10, 20, 30, 40', '(10, 20), (30, 40)' or a list - into a list of ints.
+    """
+    coord_str = str(coordinates)
+    for char in "()[]' ":
+        coord_str = coord_str.replace(char, "")
+    return [int(i) for i in coord_str.split(',')]
+
+
+def read_file_tail(file_path, max_bytes=65536, block_size=8192):
+    """
+    Reads the end of a text file - blocks are read backwards from the file end, so big files are not read completely.
+    :param max_bytes: max. size of the tail. The tail starts at a line beginning, unless it's the file start.
+    :return: the tail as a string
+    """
+    with open(file_path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        blocks = []
+        size = 0
+        while position > 0 and size < max_bytes:
+            read_size = min(block_size, position, max_bytes - size)
+            position -= read_size
+            f.seek(position)
+            blocks.append(f.read(read_size))
+            size += read_size
+        complete_first_line = position == 0
+        if position > 0:
+            f.seek(position - 1)
+            complete_first_line = f.read(1) == b"\n"
+    tail = b"".join(reversed(blocks))
+    if not complete_first_line and b"\n" in tail:  # drop the incomplete first line
+        tail = tail.split(b"\n", 1)[1]
+    return tail.decode("utf8", errors="replace")
+
+
 def single_quote_to_double(input_value):
     """
     Special for eggplant lists - replaces single quotes around all values with double quotes
@@ -263,3 +303,181 @@ def single_quote_to_double(input_value):
     s = s.replace(",'", ",\"")  # ['A','B'] --> ['A',"B']
     s = s.replace(", '", ", \"")  # ['A', 'B'] --> ['A', "B']
     return s
+
+
+class IncrementalListParser:
+    """
+    Parses a list in eggPlant format (e.g. '["xyz", [1234, "he(llo)"], True]') from chunks of the string,
+    without keeping the whole string in memory. Designed for very large script results retrieved in slices.
+
+    Values are converted the same way as in 'auto_convert':
+     - String values "True" and "False" are converted into booleans
+     - At ('@') symbol in front of string values is removed, escape sequences are decoded
+     - Unquoted values are converted into numbers or booleans if possible
+
+    A value which is not a list (first character is not '[') is collected and converted using the value converter,
+    'auto_convert' by default. With 'parse_lists' disabled, lists are collected and converted the same way.
+    If an item converter is given, it's called with each value inside of the list as a string instead.
+    If a depth is given, values are allowed at this nesting level only (1 - the outer list) and lists above it -
+    e.g. the depth 2 for a list of lists.
+    """
+
+    token_pattern = re.compile(r'\s*(?:(\[)|(\])|(,)|@?"((?:[^"\\]|\\.)*)"|(?!@")([^\[\],"]*[^\[\],"\s])(?=\s*(?:[,\]]|\Z)))', re.S)
+
+    def __init__(self, item_converter=None, depth=None, value_converter=None, parse_lists=True):
+        self.item_converter = item_converter
+        self.depth = depth
+        self.value_converter = value_converter or auto_convert
+        self.buffer = ""
+        self.stack = []
+        self.result = None
+        self.done = False
+        self.is_list = None if parse_lists else False
+        self.plain_chunks = []  # for non-list values only
+        self.last_token = None
+
+    def feed(self, chunk):
+        if self.is_list is None:
+            stripped = chunk.lstrip()
+            if not stripped:
+                self.plain_chunks.append(chunk)
+                return
+            self.is_list = stripped.startswith("[")
+        if not self.is_list:
+            self.plain_chunks.append(chunk)
+            return
+        self.buffer += chunk
+        self._parse(final=False)
+
+    def close(self):
+        if not self.is_list:
+            return self.value_converter("".join(self.plain_chunks))
+        self._parse(final=True)
+        if not self.done or self.buffer.strip():
+            raise ValueError("Unable to parse the value as a list in eggPlant format - "
+                             f"unexpected end of the value or trailing characters: '{self.buffer[:100]}'")
+        return self.result
+
+    def _parse(self, final):
+        buffer = self.buffer
+        position = 0
+        length = len(buffer)
+        while position < length:
+            match = self.token_pattern.match(buffer, position)
+            if not match:
+                if buffer[position:].strip() and final:
+                    raise ValueError(f"Unable to parse the value as a list in eggPlant format near: "
+                                     f"'{buffer[position:position + 100]}'")
+                break
+            bare_value = match.group(5)
+            if bare_value is not None and not final and not buffer[match.end():].strip():
+                break  # the value might continue in the next chunk, even after spaces
+            if self.done:
+                raise ValueError(f"Unexpected characters after the list end: '{buffer[position:position + 100]}'")
+            position = match.end()
+            self._handle_token(match)
+        self.buffer = buffer[position:]
+
+    def _handle_token(self, match):
+        open_bracket, close_bracket, separator, string_value, bare_value = match.groups()
+        if open_bracket:
+            if self.depth and len(self.stack) >= self.depth:
+                raise ValueError(f"a nested list instead of an item at the nesting level {len(self.stack)}")
+            self.stack.append([])
+            self.last_token = "["
+            return
+        if not self.stack:
+            raise ValueError("Unexpected value outside of the list")
+        current = self.stack[-1]
+        if separator:
+            if self.last_token in ("[", ","):
+                self._check_item_level()
+                current.append("")  # empty value - like ',,' and '[,'
+            self.last_token = ","
+            return
+        if close_bracket:
+            if self.last_token == ",":
+                self._check_item_level()
+                current.append("")  # empty value at the end - like ',]'
+            finished = self.stack.pop()
+            if self.stack:
+                self.stack[-1].append(finished)
+            else:
+                self.result = finished
+                self.done = True
+            self.last_token = "value"
+            return
+        self._check_item_level()
+        if string_value is not None:
+            if "\\" in string_value:
+                try:
+                    string_value = ast.literal_eval('"' + string_value + '"')
+                except (ValueError, SyntaxError):  # e.g. an invalid escape sequence - keep the string as it is
+                    pass
+            if self.item_converter:
+                current.append(self.item_converter(string_value))
+            else:
+                current.append({"True": True, "False": False}.get(string_value, string_value))
+        elif self.item_converter:
+            current.append(self.item_converter(bare_value.strip()))
+        else:
+            current.append(convert_to_num_bool_or_string(bare_value.strip()))
+        self.last_token = "value"
+
+    def _check_item_level(self):
+        if self.depth and len(self.stack) < self.depth:
+            raise ValueError(f"an item instead of a nested list at the nesting level {len(self.stack)}")
+
+
+# converters of single values for declared return types, see 'get_return_converter'
+value_converters = {'raw': str, 'str': str, 'int': int, 'float': float, 'bool': to_bool}
+
+
+@functools.lru_cache(maxsize=None)
+def get_return_converter(declaration):
+    """
+    Returns a function converting an eggPlant script result into the declared return type,
+    so the result doesn't have to be guessed using 'auto_convert'.
+    Supported types are 'raw' (the string as returned by eggPlant), 'str', 'int', 'float', 'bool', 'list'
+    and lists with a declared item type - like 'list[str]', also nested like 'list[list[int]]'.
+    Items of an untyped 'list' are converted the same way as in 'auto_convert'.
+    The nesting of typed lists must match the declaration - e.g. 'list[int]' fails for '[1, [2, 3]]'.
+    """
+    item_type = declaration.strip().lower().replace(" ", "")
+    is_list = False
+    depth = 0
+    while item_type.startswith("list[") and item_type.endswith("]"):
+        item_type = item_type[len("list["):-1]
+        is_list = True
+        depth += 1
+    if item_type == "list":
+        is_list = True
+        item_converter = None
+        depth = None  # any nesting below the declared lists
+    elif item_type in value_converters:
+        item_converter = value_converters[item_type]
+    else:
+        raise ValueError(f"Unknown return type '{declaration}', supported types: "
+                         f"{', '.join(value_converters)}, list, list[<type>]")
+
+    def not_a_list(value):
+        if value.strip():
+            raise ValueError("not a list in eggPlant format")
+        return []
+
+    def create_parser():
+        if is_list:
+            return IncrementalListParser(item_converter, depth, value_converter=not_a_list)
+        return IncrementalListParser(value_converter=item_converter, parse_lists=False)
+
+    def convert(value):
+        try:
+            parser = create_parser()
+            parser.feed(str(value))
+            return parser.close()
+        except ValueError as e:
+            raise ValueError(f"The script result {str(value)[:100]!r} doesn't match "
+                             f"the declared return type '{declaration}': {e}") from None
+    convert.declaration = declaration
+    convert.create_parser = create_parser  # for results retrieved in chunks, see 'run_chunked'
+    return convert
@@ -0,0 +1,250 @@
+"""
+Offline validation of eggPlant keyword calls in Robot Framework files - without eggPlant and eggDrive.
+
+Checks every call of an eggPlant keyword (script) or a static library keyword:
+ - number of arguments
+ - named arguments unknown to the script
+ - calls of missing scripts in known subfolders, e.g. 'Lists.returnNestedList'
+
+The keyword signatures are read from the suite once and may be saved into an index file,
+which is reused in the next runs. Robot files are checked in parallel.
+
+Usage:
+    python -m EggplantLibrary.validator --suite E:/eggPlantScripts/SuiteOne.suite tests
+    python -m EggplantLibrary.validator --suite E:/eggPlantScripts/SuiteOne.suite --index signatures.json tests
+    python -m EggplantLibrary.validator --index signatures.json tests  # reuse the saved index
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import difflib
+import json
+import os
+import re
+import sys
+
+# BuiltIn keywords running other keywords - the number of arguments before the keyword name
+RUN_KEYWORD_VARIANTS = {
+    'runkeyword': 0,
+    'runkeywordandignoreerror': 0,
+    'runkeywordandreturnstatus': 0,
+    'runkeywordandcontinueonfailure': 0,
+    'runkeywordandwarnonfailure': 0,
+    'runkeywordandreturn': 0,
+    'runkeywordandexpecterror': 1,
+    'waituntilkeywordsucceeds': 2,
+    'repeatkeyword': 1,
+}
+
+named_argument_pattern = re.compile(r'^([A-Za-z_]\w*)=(.*)$', re.S)
+
+
+def normalize(name):
+    """
+    Normalizes a keyword name the RF way - case, spaces and underscores are ignored
+    """
+    return name.lower().replace(" ", "").replace("_", "")
+
+
+def build_signature_index(suite, scripts_dir='Scripts'):
+    """
+    Reads keyword names and arguments of all eggPlant scripts in the suite and of the static library keywords.
+    :return: the index dict - {'suite': path, 'keywords': {name: [[arg], [arg, default], ...]}, 'folders': [...]}
+    """
+    from . import EggplantLibrary
+
+    library = EggplantLibrary(suite=suite, scripts_dir=scripts_dir)
+    names = library.get_keyword_names()
+
+    def signature(name):
+        arguments = []
+        for argument in library.get_keyword_arguments(name):
+            if isinstance(argument, str):  # static keywords - 'name=default' or '*args'
+                argument = tuple(argument.split("=", 1))
+            arguments.append(list(argument))
+        return name, arguments
+
+    with ThreadPoolExecutor() as executor:
+        keywords = dict(executor.map(signature, names))
+
+    folders = set()
+    for name in names:
+        if not library.get_static_keyword(name):
+            parts = name.split(".")[:-1]
+            for i in range(1, len(parts) + 1):
+                folders.add(".".join(parts[:i]))
+    return {'suite': library.eggplant_suite, 'scripts_dir': scripts_dir, 'keywords': keywords,
+            'folders': sorted(folders)}
+
+
+class CallValidator:
+    """
+    Validates keyword calls against the signature index
+    """
+
+    def __init__(self, index, library_names=('EggplantLibrary',)):
+        self.keywords = {normalize(name): (name, arguments) for name, arguments in index['keywords'].items()}
+        self.folders = {normalize(folder) for folder in index['folders']}
+        self.library_names = {normalize(name) for name in library_names}
+        self.script_names = [name for name in index['keywords'] if "." in name]
+
+    def resolve(self, keyword):
+        """
+        Returns the normalized keyword name without a possible library name prefix
+        """
+        normalized = normalize(keyword)
+        if normalized not in self.keywords and "." in normalized:
+            prefix, rest = normalized.split(".", 1)
+            if prefix in self.library_names:
+                return rest
+        return normalized
+
+    def validate_call(self, keyword, args):
+        """
+        Returns a list of problems (strings) of the keyword call. Calls of unknown keywords are ignored,
+        unless they look like a missing script in a known subfolder.
+        """
+        normalized = self.resolve(keyword)
+        run_keyword_args = RUN_KEYWORD_VARIANTS.get(normalized)
+        if run_keyword_args is not None:
+            if len(args) > run_keyword_args:
+                return self.validate_call(args[run_keyword_args], args[run_keyword_args + 1:])
+            return []
+
+        if normalized not in self.keywords:
+            if "." in normalized and normalized.rsplit(".", 1)[0] in self.folders:
+                message = f"Keyword '{keyword}' not found - no such eggPlant script"
+                suggestions = difflib.get_close_matches(keyword.replace(" ", ""), self.script_names, n=3)
+                if suggestions:
+                    message += f". Did you mean: {', '.join(suggestions)}?"
+                return [message]
+            return []
+
+        name, arguments = self.keywords[normalized]
+        return self.validate_arguments(name, arguments, args)
+
+    def validate_arguments(self, name, arguments, args):
+        if any(arg.startswith(("@{", "&{")) for arg in args):
+            return []  # list and dict variables are expanded only at run time
+
+        problems = []
+        names = [argument[0] for argument in arguments if not argument[0].startswith("*")]
+        has_varargs = any(argument[0].startswith("*") and not argument[0].startswith("**") for argument in arguments)
+        has_kwargs = any(argument[0].startswith("**") for argument in arguments)
+        required = [argument[0] for argument in arguments if len(argument) == 1 and not argument[0].startswith("*")]
+
+        positional = 0
+        named = set()
+        for arg in args:
+            match = named_argument_pattern.match(arg)
+            if match and (match.group(1) in names or has_kwargs):
+                named.add(match.group(1))
+                continue
+            if match and not has_varargs:
+                problems.append(f"Keyword '{name}' has no argument named '{match.group(1)}'"
+                                f" - known arguments: {', '.join(names) or 'none'}")
+                continue
+            if named:
+                problems.append(f"Keyword '{name}': positional argument '{arg}' after named arguments")
+            positional += 1
+
+        if positional > len(names) and not has_varargs:
+            problems.append(f"Keyword '{name}' expects at most {len(names)} arguments, got {positional}")
+        missing = [arg for arg in required[positional:] if arg not in named]
+        if missing:
+            problems.append(f"Keyword '{name}' misses required arguments: {', '.join(missing)}")
+        return problems
+
+
+def find_calls(file_path):
+    """
+    Returns a list of tuples (line number, keyword name, arguments) of all keyword calls, setups and teardowns
+    in the file. Library imports are added with the keyword name None and arguments (library name, alias).
+    """
+    from robot.api import get_model
+    from robot.api.parsing import ModelVisitor
+
+    calls = []
+
+    class CallCollector(ModelVisitor):
+        def visit_KeywordCall(self, node):
+            calls.append((node.lineno, node.keyword, list(node.args)))
+
+        def visit_Fixture(self, node):  # setups and teardowns
+            if node.name:
+                calls.append((node.lineno, node.name, list(node.args)))
+
+        def visit_LibraryImport(self, node):
+            calls.append((node.lineno, None, [node.name, node.alias or ""]))
+
+    CallCollector().visit(get_model(file_path))
+    return calls
+
+
+def validate_file(file_path, index):
+    """
+    :return: a list of problems (file path, line number, message)
+    """
+    calls = find_calls(file_path)
+    library_names = ['EggplantLibrary']
+    for _, keyword, args in calls:
+        if keyword is None and args[1] and normalize(args[0]).rstrip("/").endswith("eggplantlibrary"):
+            library_names.append(args[1])  # imported 'WITH NAME'
+    validator = CallValidator(index, library_names)
+
+    problems = []
+    for line, keyword, args in calls:
+        if keyword is None or "${" in keyword:
+            continue
+        for problem in validator.validate_call(keyword, args):
+            problems.append((file_path, line, problem))
+    return problems
+
+
+def collect_robot_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isfile(path):
+            files.append(path)
+        for root, _, names in os.walk(path):
+            files.extend(os.path.join(root, name) for name in sorted(names) if name.endswith((".robot", ".resource")))
+    return files
+
+
+def validate(paths, index, jobs=None):
+    files = collect_robot_files(paths)
+    problems = []
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        for file_problems in executor.map(validate_file, files, [index] * len(files), chunksize=16):
+            problems.extend(file_problems)
+    return files, problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", help="Robot files or folders to check")
+    parser.add_argument("--suite", help="path to the eggPlant .suite folder - the index is built from it")
+    parser.add_argument("--scripts-dir", default="Scripts")
+    parser.add_argument("--index", help="signature index file - saved if --suite is given, loaded otherwise")
+    parser.add_argument("--jobs", type=int, default=None, help="number of parallel processes")
+    args = parser.parse_args(argv)
+
+    if args.suite:
+        index = build_signature_index(os.path.abspath(args.suite), args.scripts_dir)
+        if args.index:
+            with open(args.index, "w", encoding="utf8") as f:
+                json.dump(index, f, indent=1)
+    elif args.index:
+        with open(args.index, encoding="utf8") as f:
+            index = json.load(f)
+    else:
+        parser.error("either --suite or --index is required")
+
+    files, problems = validate(args.paths, index, args.jobs)
+    for file_path, line, message in problems:
+        print(f"{file_path}:{line}: {message}")
+    print(f"Checked {len(files)} files against {len(index['keywords'])} keywords: {len(problems)} problems found")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
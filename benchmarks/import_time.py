@@ -0,0 +1,62 @@
+"""
+Measures the import time of the library using 'python -X importtime'.
+
+Usage:
+    python benchmarks/import_time.py [--runs 5] [--top 15] [--max-ms 300]
+
+The import is repeated in fresh interpreters, the median of the cumulative library import time is reported
+together with the slowest modules. With '--max-ms' the script exits with code 1 if the median exceeds the limit,
+so it can be used in CI to make regressions visible.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure_once(module):
+    """
+    Imports the module in a fresh interpreter and returns a dict 'module name -> (self us, cumulative us)'
+    """
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                               cwd=REPO_DIR, capture_output=True, text=True, check=True)
+    timings = {}
+    for line in completed.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="EggplantLibrary")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--max-ms", type=float, default=None, help="fail if the median import time exceeds it")
+    args = parser.parse_args()
+
+    runs = [measure_once(args.module) for _ in range(args.runs)]
+    totals_ms = [run[args.module][1] / 1000 for run in runs]
+    median_ms = statistics.median(totals_ms)
+
+    print(f"'{args.module}' import time, median of {args.runs} runs: {median_ms:.1f} ms "
+          f"(min {min(totals_ms):.1f} ms, max {max(totals_ms):.1f} ms)")
+    print("Slowest modules (self time, last run):")
+    slowest = sorted(runs[-1].items(), key=lambda item: item[1][0], reverse=True)[:args.top]
+    for name, (self_us, cumulative_us) in slowest:
+        print(f"  {self_us / 1000:8.2f} ms self  {cumulative_us / 1000:8.2f} ms cumulative  {name}")
+
+    if args.max_ms is not None and median_ms > args.max_ms:
+        print(f"FAILED: import time {median_ms:.1f} ms exceeds the limit of {args.max_ms:.1f} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""
+Compares decoding of eggDrive XML RPC responses by the stock 'xmlrpc.client' parser and by the library parser.
+
+Usage:
+    python benchmarks/xmlrpc_response.py [--runs 5] [--sizes 10000,1000000,5000000]
+
+The responses look like the 'RunWithNewResults' responses of eggDrive - an eggPlant output with the given number
+of characters (one line per command), a 'Result' struct with a 'RunDate' and a return value list.
+The stock parser is fed in 1 KB blocks like by the standard transport, the library parser in 64 KB blocks
+like by 'TimeoutTransport'. The decoded values are compared, apart from 'RunDate', which the library keeps as a string.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import xmlrpc.client
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from EggplantLibrary import response  # noqa: E402
+
+
+def build_response(output_size):
+    line = "28.01.19, 16:32:16\tclick\t\"OK_Button\" at (412, 233) <image> & \"quoted\"\n"
+    output = (line * (output_size // len(line) + 1))[:output_size]
+    result = {'Duration': 0.578999996185, 'ErrorMessage': '', 'Errors': 0.0, 'Exceptions': 0.0,
+              'LogFile': 'E:/eggPlantScripts/SuiteOne.suite/Results/getNotepadText/20190125_144557.016/LogFile.txt',
+              'ReturnValue': '["xyz", [1234, "he(llo)"], "True"]' * max(1, output_size // 100000),
+              'RunDate': xmlrpc.client.DateTime('20190125T14:45:57'), 'Status': 'Success',
+              'Successes': 1.0, 'Warnings': 0.0}
+    return xmlrpc.client.dumps(({'Duration': 0.61, 'Output': output, 'Result': result},),
+                               methodresponse=True).encode('utf8')
+
+
+def decode(data, getparser, block_size):
+    parser, unmarshaller = getparser()
+    for start in range(0, len(data), block_size):
+        parser.feed(data[start:start + block_size])
+    parser.close()
+    return unmarshaller.close()
+
+
+def measure(data, getparser, block_size, runs):
+    durations = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        decode(data, getparser, block_size)
+        durations.append(time.perf_counter() - started)
+    return statistics.median(durations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--sizes", default="10000,1000000,5000000", help="output sizes in characters")
+    args = parser.parse_args()
+
+    for size in [int(size) for size in args.sizes.split(",")]:
+        data = build_response(size)
+        expected = decode(data, xmlrpc.client.getparser, 1024)
+        actual = decode(data, response.getparser, 64 * 1024)
+        expected[0]['Result']['RunDate'] = expected[0]['Result']['RunDate'].value
+        if actual != expected:
+            print(f"FAILED: the decoded values differ for the output size {size}")
+            return 1
+
+        stock = measure(data, xmlrpc.client.getparser, 1024, args.runs)
+        library = measure(data, response.getparser, 64 * 1024, args.runs)
+        print(f"response {len(data) / 1024:9.0f} KB: stock {stock * 1000:8.1f} ms, "
+              f"library {library * 1000:8.1f} ms, {stock / library:5.1f}x faster")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,231 @@
+import os
+import re
+import sys
+import threading
+import time
+import xmlrpc.client
+from socketserver import ThreadingMixIn
+from xmlrpc.server import SimpleXMLRPCServer
+
+from robot.libraries.BuiltIn import BuiltIn
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from EggplantLibrary.utils import IncrementalListParser  # noqa: E402
+
+
+class ThreadingXMLRPCServer(ThreadingMixIn, SimpleXMLRPCServer):
+    daemon_threads = True
+
+
+class MessageRecorder:
+    """
+    Library listener keeping the messages logged in the current test
+    """
+    ROBOT_LISTENER_API_VERSION = 2
+
+    def __init__(self):
+        self.messages = []
+
+    def start_test(self, name, attrs):
+        self.messages = []
+
+    def log_message(self, message):
+        self.messages.append(message['message'])
+
+
+class FakeEggDrive:
+    """
+    Fake eggDrive XML RPC server for the offline self-tests - no eggPlant needed.
+
+    Scripts called using 'RunWithNewResults', in the lightweight and in the chunked mode return the values
+    set by `Set Script Result`, all other commands return an empty result. Like eggDrive, only a single session
+    may be open - starting another one fails with 'BUSY: Session in progress'.
+    """
+
+    ROBOT_LIBRARY_SCOPE = 'GLOBAL'
+
+    def __init__(self, port=5499):
+        self.lock = threading.Lock()
+        self.message_recorder = self.ROBOT_LIBRARY_LISTENER = MessageRecorder()
+        self.reset_fake_eggdrive()
+        self.server = ThreadingXMLRPCServer(('127.0.0.1', int(port)), logRequests=False)
+        for function in (self.startsession, self.endsession, self.execute):
+            self.server.register_function(function)
+        threading.Thread(target=self.server.serve_forever, name="FakeEggDrive", daemon=True).start()
+
+    # ---------- eggDrive API ---------------------------------
+    def startsession(self, suite):
+        with self.lock:
+            if self.open_suite is not None:
+                raise xmlrpc.client.Fault(1, "BUSY: Session in progress")
+            self.open_suite = suite
+            self.session_calls.append(f"start {os.path.basename(suite)}")
+        return ''
+
+    def endsession(self, suite):
+        with self.lock:
+            self.session_calls.append(f"end {os.path.basename(suite)}")
+            if self.end_session_fails:
+                self.end_session_fails = False
+                raise xmlrpc.client.Fault(1, "Failed on purpose")
+            if self.open_suite is None:
+                raise xmlrpc.client.Fault(1, "Can't End Session -- No Session is Active")
+            if suite != self.open_suite:
+                raise xmlrpc.client.Fault(1, f"No session with the suite {suite} in progress")
+            self.open_suite = None
+        return ''
+
+    def execute(self, command):
+        with self.lock:
+            self.commands.append(command)
+            if self.failing_commands:
+                self.failing_commands -= 1
+                raise xmlrpc.client.Fault(1, self.command_fault)
+        chunk = re.match(r'return characters (\d+) to (\d+) of global rfChunkedValue', command)
+        if chunk:
+            return self.response(self.chunked_value[int(chunk.group(1)) - 1:int(chunk.group(2))])
+        if command == 'put empty into global rfChunkedValue':
+            self.chunked_value = ''
+            return self.response('')
+
+        script = re.match(r'(?:RunWithNewResults|[\s\S]*\n\s*run) "([^"]+)"', command)
+        if not script:
+            return self.response('')
+        status, return_value, output, error, delay, log_file = self.script_results.get(script.group(1),
+                                                                                       ('Success', '', '', '', 0, ''))
+        with self.lock:
+            self.running_scripts += 1
+            self.max_running_scripts = max(self.max_running_scripts, self.running_scripts)
+        time.sleep(delay)
+        with self.lock:
+            self.running_scripts -= 1
+        if 'global rfChunkedValue' in command:
+            self.chunked_value = return_value
+            return_value = str(len(return_value))
+        result = {'Status': status, 'ReturnValue': return_value, 'Duration': 0.01, 'LogFile': log_file,
+                  'RunDate': xmlrpc.client.DateTime('20190125T14:45:57')}
+        if status != 'Success':
+            result['ErrorMessage'] = error
+        return self.response(result, output)
+
+    @staticmethod
+    def response(result, output=''):
+        return {'Output': output, 'Duration': 0.02, 'Result': result}
+
+    # ---------- keywords ---------------------------------
+    def reset_fake_eggdrive(self):
+        self.open_suite = None
+        self.script_results = {}  # script name -> (status, return value, output, error message, delay, log file)
+        self.commands = []
+        self.session_calls = []
+        self.chunked_value = ''
+        self.end_session_fails = False
+        self.failing_commands = 0
+        self.command_fault = ''
+        self.running_scripts = 0
+        self.max_running_scripts = 0  # eggDrive runs a single command at a time, more would be a library bug
+
+    def set_script_result(self, script, return_value='', status='Success', output='', error='', delay=0, log_file=''):
+        """
+        Sets the result of the script, e.g. 'returnTheSameValue' or 'Lists/returnList'.
+        The response is sent after the `delay` in seconds, `log_file` is the path of the eggPlant log file.
+        """
+        self.script_results[script] = (status, str(return_value), output.replace('\\t', '\t'), error, float(delay),
+                                       log_file)
+
+    def open_session_outside_of_library(self, suite):
+        self.startsession(suite)
+
+    def fail_next_end_session(self):
+        """
+        The next 'EndSession' call fails and the session stays open
+        """
+        self.end_session_fails = True
+
+    def fail_next_commands(self, count=1, fault="BUSY: Session in progress"):
+        """
+        The next `count` 'Execute' calls fail with the fault
+        """
+        self.failing_commands = int(count)
+        self.command_fault = fault
+
+    def session_should_be_open(self, suite):
+        """
+        :param suite: the suite folder name, e.g. 'SuiteOne.suite'
+        """
+        if os.path.basename(self.open_suite or '') != suite:
+            raise AssertionError(f"Open session: {self.open_suite}, expected: {suite}")
+
+    def session_calls_should_be(self, *calls):
+        """
+        Checks the session calls since the reset, e.g. 'start SuiteOne.suite', 'end SuiteOne.suite'
+        """
+        if list(calls) != self.session_calls:
+            raise AssertionError(f"Session calls: {self.session_calls}, expected: {list(calls)}")
+
+    def commands_should_contain(self, text):
+        if not any(text in command for command in self.commands):
+            raise AssertionError(f"No command containing '{text}' received: {self.commands}")
+
+    def commands_should_not_contain(self, text):
+        commands = [command for command in self.commands if text in command]
+        if commands:
+            raise AssertionError(f"Commands containing '{text}' received: {commands}")
+
+    def scripts_should_not_overlap(self):
+        """
+        Checks that no scripts were run at the same time since the reset
+        """
+        if self.max_running_scripts > 1:
+            raise AssertionError(f"{self.max_running_scripts} scripts were running at the same time")
+
+    def logged_messages_should_contain(self, text):
+        """
+        Checks the messages logged in the current test
+        """
+        if not any(text in message for message in self.message_recorder.messages):
+            raise AssertionError(f"No message containing '{text}' logged: {self.message_recorder.messages}")
+
+    def logged_messages_should_not_contain(self, text):
+        messages = [message for message in self.message_recorder.messages if text in message]
+        if messages:
+            raise AssertionError(f"Messages containing '{text}' logged: {messages}")
+
+    def get_eggplant_library(self):
+        return BuiltIn().get_library_instance('EggplantLibrary')
+
+    def run_keywords_in_threads(self, *names):
+        """
+        Runs the eggPlant keywords (without arguments) at the same time, each one in an own thread -
+        the next thread is started shortly after the previous one. Returns the results in the keyword order.
+        """
+        library = self.get_eggplant_library()
+        results = [None] * len(names)
+        errors = []
+
+        def run(index, name):
+            try:
+                results[index] = library.run_keyword(name, [])
+            except Exception as e:
+                errors.append(f"{name}: {e}")
+
+        threads = [threading.Thread(target=run, args=(index, name)) for index, name in enumerate(names)]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.1)
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise AssertionError("\n".join(errors))
+        return results
+
+    def parse_list_in_chunks(self, value, chunk_size):
+        """
+        Parses the list using 'IncrementalListParser', fed in chunks of the size
+        """
+        parser = IncrementalListParser()
+        chunk_size = int(chunk_size)
+        for start in range(0, len(value), chunk_size):
+            parser.feed(value[start:start + chunk_size])
+        return parser.close()